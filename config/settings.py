@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 from dotenv import load_dotenv
 import dj_database_url
@@ -63,6 +64,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "downloader.middleware.ProfilingMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -151,3 +153,61 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # App settings
 # --------------------------------------------------------------------------------------
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
+
+# Endpoint /metrics (format Prometheus). Obligatoire hors DEBUG (sinon /metrics répond 403).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Dossier où chaque worker dépose ses valeurs : /metrics agrège tous les workers de la
+# machine. Défini par gunicorn.conf.py pour le serveur uniquement (jamais pour les tests,
+# runserver ou les commandes). Vide = valeurs du seul processus.
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+
+# Backend de coordination (cache des métadonnées, verrous, files de tâches) :
+# locmem:// (dev), sqlite:///chemin.db (une machine), redis://hôte:6379/0 (plusieurs machines).
+# Hors DEBUG, défaut SQLite : locmem ne serait pas partagé entre les workers gunicorn.
+COORDINATION_URL = os.getenv(
+    "COORDINATION_URL",
+    "locmem://" if DEBUG else f"sqlite://{os.path.join(tempfile.gettempdir(), 'appolon_coordination.db')}",
+)
+
+# Cache des métadonnées yt-dlp + préchargement des résultats de recherche.
+VIDEO_INFO_CACHE_TTL = int(os.getenv("VIDEO_INFO_CACHE_TTL", "1800"))
+VIDEO_INFO_WAIT_TIMEOUT = float(os.getenv("VIDEO_INFO_WAIT_TIMEOUT", "60"))
+VIDEO_INFO_LOCK_TTL = float(os.getenv("VIDEO_INFO_LOCK_TTL", "120"))
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1") == "1"
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "3"))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "2"))
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "64"))
+PREFETCH_BATCH_TTL = int(os.getenv("PREFETCH_BATCH_TTL", "300"))
+
+# Proxy des miniatures de recherche (cache disque + WebP si Pillow est installé).
+THUMBNAIL_CACHE_DIR = os.getenv("THUMBNAIL_CACHE_DIR", str(BASE_DIR / "var" / "thumbnails"))
+THUMBNAIL_WEBP_QUALITY = int(os.getenv("THUMBNAIL_WEBP_QUALITY", "70"))
+THUMBNAIL_MAX_AGE = int(os.getenv("THUMBNAIL_MAX_AGE", str(365 * 24 * 3600)))
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv("THUMBNAIL_CACHE_MAX_BYTES", str(256 * 1024 ** 2)))
+
+# Extraits (clips) : cache disque par (vidéo, format, plage).
+CLIP_CACHE_DIR = os.getenv("CLIP_CACHE_DIR", str(BASE_DIR / "var" / "clips"))
+CLIP_CACHE_MAX_BYTES = int(os.getenv("CLIP_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+CLIP_MIN_COPY_SECONDS = float(os.getenv("CLIP_MIN_COPY_SECONDS", "10"))
+
+# Admission des téléchargements selon l'espace disque (voir downloader/services/storage.py).
+DOWNLOAD_DISK_BUDGET = int(os.getenv("DOWNLOAD_DISK_BUDGET", "0"))  # octets, 0 = espace libre réel
+DOWNLOAD_DISK_MARGIN = int(os.getenv("DOWNLOAD_DISK_MARGIN", str(512 * 1024 ** 2)))
+DOWNLOAD_SIZE_MARGIN = float(os.getenv("DOWNLOAD_SIZE_MARGIN", "1.2"))
+DOWNLOAD_SIZE_FALLBACK = int(os.getenv("DOWNLOAD_SIZE_FALLBACK", str(500 * 1024 ** 2)))
+DOWNLOAD_QUEUE_TIMEOUT = float(os.getenv("DOWNLOAD_QUEUE_TIMEOUT", "60"))
+DOWNLOAD_QUEUE_MAX = int(os.getenv("DOWNLOAD_QUEUE_MAX", "8"))
+# Réservations partagées par les workers de la machine : fichier local (même disque que /tmp).
+DOWNLOAD_RESERVATIONS_DB = os.getenv(
+    "DOWNLOAD_RESERVATIONS_DB", os.path.join(tempfile.gettempdir(), "appolon_reservations.sqlite3")
+)
+
+# Profilage des requêtes (opt-in). Voir downloader/middleware.py.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_MODE = os.getenv("PROFILING_MODE", "cprofile")  # cprofile | sample
+PROFILING_SAMPLE_INTERVAL = float(os.getenv("PROFILING_SAMPLE_INTERVAL", "0.005"))
+PROFILING_HEADER = os.getenv("PROFILING_HEADER", "X-Appolon-Profile")
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE", "3600"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", str(BASE_DIR / "var" / "profiles"))
+PROFILING_MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "200"))
@@ -17,7 +17,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from downloader import views as downloader_views
+
 urlpatterns = [
+    path("admin/profiles/", admin.site.admin_view(downloader_views.profile_index), name="admin_profiles"),
+    path(
+        "admin/profiles/<str:filename>",
+        admin.site.admin_view(downloader_views.profile_download),
+        name="admin_profile_download",
+    ),
     path('admin/', admin.site.urls),
     path("", include("downloader.urls")),
     path("accounts/", include("django.contrib.auth.urls"))
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import socket
+import socketserver
+import threading
+import time
+from collections import deque
+
+from downloader.services.coordination import COMPARE_AND_DELETE
+
+
+class _Store:
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.lists: dict[bytes, deque[bytes]] = {}
+        self.cond = threading.Condition()
+
+    def live(self, key: bytes) -> bytes | None:
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "FakeRedisServer"
+
+    def handle(self):
+        self.server.connections.add(self.connection)
+        try:
+            self._serve()
+        finally:
+            self.server.connections.discard(self.connection)
+
+    def _serve(self):
+        while True:
+            try:
+                args = self._read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            cmd = args[0].upper().decode()
+            try:
+                reply = self._dispatch(cmd, args[1:])
+            except Exception as exc:
+                reply = RuntimeError(f"ERR {exc}")
+            if cmd in self.server.drop_replies:
+                # Commande exécutée mais réponse perdue (coupure réseau simulée).
+                self.server.drop_replies.discard(cmd)
+                return
+            self.wfile.write(_encode(reply))
+
+    def _read_command(self) -> list[bytes] | None:
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            raise ValueError("Seules les commandes RESP (tableaux) sont supportées")
+        args = []
+        for _ in range(int(line[1:-2])):
+            size = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(size + 2)[:-2])
+        return args
+
+    def _dispatch(self, cmd: str, args: list[bytes]):
+        store = self.server.store
+        with store.cond:
+            if cmd in ("PING", "AUTH", "SELECT"):
+                return "PONG" if cmd == "PING" else "OK"
+            if cmd == "FLUSHDB":
+                store.data.clear()
+                store.lists.clear()
+                return "OK"
+            if cmd == "GET":
+                return store.live(args[0])
+            if cmd == "SET":
+                return self._set(store, args)
+            if cmd == "DEL":
+                return sum(
+                    1 for k in args
+                    if store.data.pop(k, None) is not None or store.lists.pop(k, None) is not None
+                )
+            if cmd == "EVAL":
+                if args[0].decode() != COMPARE_AND_DELETE:
+                    raise ValueError("script EVAL non supporté par le serveur de test")
+                key, value = args[2], args[3]
+                if store.live(key) == value:
+                    del store.data[key]
+                    return 1
+                return 0
+            if cmd == "LPUSH":
+                items = store.lists.setdefault(args[0], deque())
+                for v in args[1:]:
+                    items.appendleft(v)
+                store.cond.notify_all()
+                return len(items)
+            if cmd == "LLEN":
+                return len(store.lists.get(args[0]) or ())
+            if cmd == "BRPOP":
+                return self._brpop(store, args[:-1], float(args[-1]))
+        raise ValueError(f"commande inconnue '{cmd}'")
+
+    def _set(self, store: _Store, args: list[bytes]):
+        key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+        expires = None
+        if b"PX" in options:
+            expires = time.monotonic() + int(args[2 + options.index(b"PX") + 1]) / 1000
+        if b"EX" in options:
+            expires = time.monotonic() + int(args[2 + options.index(b"EX") + 1])
+        if b"NX" in options and store.live(key) is not None:
+            return None
+        store.data[key] = (value, expires)
+        return "OK"
+
+    def _brpop(self, store: _Store, keys: list[bytes], timeout: float):
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            for key in keys:
+                items = store.lists.get(key)
+                if items:
+                    return [key, items.pop()]
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            store.cond.wait(remaining)
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, RuntimeError):
+        return f"-{value}\r\n".encode()
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(_encode(v) for v in value)
+    raise TypeError(type(value))
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """
+    Serveur local parlant le protocole Redis (RESP2), limité aux commandes utilisées
+    par RedisBackend. Permet de tester / mesurer le backend Redis sans Redis installé.
+
+        with FakeRedisServer() as server:
+            backend = backend_from_url(server.url)
+
+    Pannes simulées : `drop_replies` (commandes exécutées dont la réponse est perdue,
+    une fois chacune) et `close_connections()` (redémarrage / idle timeout du serveur).
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.store = _Store()
+        self.drop_replies: set[str] = set()
+        self.connections: set[socket.socket] = set()
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-redis", daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def close_connections(self) -> None:
+        for conn in list(self.connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
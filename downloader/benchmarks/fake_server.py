@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+CHUNK_SIZE = 64 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeMediaServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # noqa: A002 - signature imposée
+        pass
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+
+        if parsed.path == "/youtube/v3/search":
+            return self._send_json(self.server.search_payload)
+        if parsed.path == "/videoplayback":
+            size = int((query.get("size") or ["0"])[0])
+            rate = int((query.get("rate") or [self.server.rate])[0])
+            return self._send_media(size, rate)
+
+        self.send_error(404)
+
+    def _send_json(self, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_media(self, size: int, rate: int):
+        start, end = 0, size - 1
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range") or "")
+        if match:
+            start = int(match.group(1) or 0)
+            end = min(int(match.group(2) or end), size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        # Débit contrôlé : on cadence l'envoi par blocs de CHUNK_SIZE.
+        chunk = self.server.chunk
+        sent = 0
+        began = time.perf_counter()
+        try:
+            while sent < length:
+                n = min(CHUNK_SIZE, length - sent)
+                self.wfile.write(chunk[:n])
+                sent += n
+                if rate:
+                    ahead = sent / rate - (time.perf_counter() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class FakeMediaServer(ThreadingHTTPServer):
+    """
+    Serveur HTTP local remplaçant googlevideo.com et l'API YouTube pour les benchmarks :
+    - /videoplayback?size=N[&rate=B]  → N octets factices (Range supporté), débit B octets/s
+    - /youtube/v3/search              → réponse API enregistrée (fixtures/search_response.json)
+
+        with FakeMediaServer(rate=20 * 1024 * 1024) as server:
+            server.base_url  # http://127.0.0.1:<port>
+    """
+
+    daemon_threads = True
+
+    def __init__(self, rate: int = 0):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.rate = rate
+        self.chunk = bytes(range(256)) * (CHUNK_SIZE // 256)
+        self.search_payload = load_fixture("search_response.json")
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-media-server", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def load_fixture(name: str, media_base: str = "") -> dict:
+    """
+    Charge une fixture JSON ; `{media}` est remplacé par l'URL du serveur local.
+    """
+    text = (FIXTURES_DIR / name).read_text(encoding="utf-8")
+    return json.loads(text.replace("{media}", media_base))
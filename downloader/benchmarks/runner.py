@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import copy
+import ipaddress
+import json
+import math
+import multiprocessing
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from queue import Empty
+from typing import Any, Callable
+from unittest import mock
+
+from django.conf import settings
+
+from .fake_redis import FakeRedisServer
+from .fake_server import FakeMediaServer, load_fixture
+
+
+# Opération de benchmark : exécutée `iterations` fois, retourne le nombre d'octets traités.
+Operation = Callable[[], int]
+
+
+@dataclass
+class Scenario:
+    name: str
+    iterations: int
+    setup: Callable[[ExitStack, FakeMediaServer], Operation]
+    warmup: int = 1
+    needs_db: bool = False
+    requires_ffmpeg: bool = False
+
+
+# --------------------------------------------------------------------------------------
+# Garde réseau : le benchmark ne doit jamais sortir de la machine
+# --------------------------------------------------------------------------------------
+class NetworkDisabled(OSError):
+    pass
+
+
+def _guard_network(stack: ExitStack) -> None:
+    original = socket.socket.connect
+
+    def connect(sock, address):
+        host = address[0] if isinstance(address, tuple) else None
+        if host is not None:
+            try:
+                loopback = ipaddress.ip_address(host).is_loopback
+            except ValueError:
+                loopback = host == "localhost"
+            if not loopback:
+                raise NetworkDisabled(f"Accès réseau interdit pendant le benchmark : {address!r}")
+        return original(sock, address)
+
+    stack.enter_context(mock.patch.object(socket.socket, "connect", connect))
+
+
+# --------------------------------------------------------------------------------------
+# Scénarios
+# --------------------------------------------------------------------------------------
+def _choices_setup(builder_name: str):
+    def setup(stack: ExitStack, server: FakeMediaServer) -> Operation:
+        from downloader.services import ytdlp_service
+
+        builder = getattr(ytdlp_service, builder_name)
+        info = load_fixture("video_info.json", server.base_url)
+
+        def op() -> int:
+            builder(info)
+            return 0
+        return op
+    return setup
+
+
+def _search_setup(stack: ExitStack, server: FakeMediaServer) -> Operation:
+    from downloader.services import youtube
+
+    stack.enter_context(mock.patch.object(youtube, "YOUTUBE_SEARCH_URL", f"{server.base_url}/youtube/v3/search"))
+    stack.enter_context(mock.patch.object(settings, "YOUTUBE_API_KEY", "bench-key"))
+
+    def op() -> int:
+        youtube.search_youtube_videos(query="django", max_results=12)
+        return 0
+    return op
+
+
+def _download_setup(mode: str, format_id: str):
+    """
+    Rejoue tout le flux `download_media` (vue Django + yt-dlp + envoi du fichier)
+    à partir de l'info dict enregistrée ; les médias viennent du serveur local.
+    """
+    def setup(stack: ExitStack, server: FakeMediaServer) -> Operation:
+        from django.test import Client
+        from yt_dlp import YoutubeDL
+
+        from downloader.services import ytdlp_service
+
+        info = load_fixture("video_info.json", server.base_url)
+
+        def replay(self, url, download=True, *args, **kwargs):
+            self.params["noprogress"] = True
+            return self.process_ie_result(copy.deepcopy(info), download=download)
+
+        stack.enter_context(mock.patch.object(ytdlp_service, "extract_video_info", lambda url: copy.deepcopy(info)))
+        stack.enter_context(mock.patch.object(YoutubeDL, "extract_info", replay))
+        client = Client()
+        data = {"url": info["webpage_url"], "mode": mode, "format_id": format_id}
+
+        def op() -> int:
+            response = client.post("/download/", data)
+            if response.status_code != 200 or not response.streaming:
+                raise RuntimeError(f"Réponse inattendue : {response.status_code}")
+            size = sum(len(chunk) for chunk in response.streaming_content)
+            response.close()
+            return size
+        return op
+    return setup
+
+
+def _coordination_setup(kind: str):
+    """
+    Aller-retour typique sur le backend de coordination : cache de l'info dict,
+    verrou, file de tâches. Le backend Redis parle au serveur RESP local.
+    """
+    def setup(stack: ExitStack, server: FakeMediaServer) -> Operation:
+        from downloader.services.coordination import backend_from_url
+
+        if kind == "redis":
+            url = stack.enter_context(FakeRedisServer()).url
+        elif kind == "sqlite":
+            url = f"sqlite:///{stack.enter_context(tempfile.TemporaryDirectory())}/coordination.db"
+        else:
+            url = "locmem://"
+        backend = backend_from_url(url)
+        info = load_fixture("video_info.json", server.base_url)
+
+        def op() -> int:
+            backend.set_object("bench:info", info, 60)
+            backend.get_object("bench:info")
+            with backend.lock("bench", ttl=5):
+                pass
+            backend.push("bench:queue", b"task")
+            backend.pop(["bench:queue"], 1)
+            return 0
+        return op
+    return setup
+
+
+SCENARIOS = [
+    Scenario("build_audio_choices", iterations=2000, setup=_choices_setup("build_audio_choices"), warmup=50),
+    Scenario("build_video_choices", iterations=2000, setup=_choices_setup("build_video_choices"), warmup=50),
+    Scenario("search_youtube_videos", iterations=200, setup=_search_setup, warmup=5),
+    Scenario("coordination_locmem", iterations=2000, setup=_coordination_setup("locmem"), warmup=50),
+    Scenario("coordination_sqlite", iterations=500, setup=_coordination_setup("sqlite"), warmup=10),
+    Scenario("coordination_redis", iterations=500, setup=_coordination_setup("redis"), warmup=10),
+    Scenario("download_audio", iterations=5, setup=_download_setup("audio", "140"), needs_db=True),
+    Scenario("download_video", iterations=3, setup=_download_setup("video", "18"), needs_db=True,
+             requires_ffmpeg=True),
+]
+
+
+# --------------------------------------------------------------------------------------
+# Exécution
+# --------------------------------------------------------------------------------------
+def percentile(values: list[float], pct: float) -> float:
+    """Percentile « nearest-rank » (valeurs déjà triées)."""
+    if not values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(values)), 1)
+    return values[rank - 1]
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux : Ko ; macOS : octets
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _isolate_node_state(stack: ExitStack) -> None:
+    """
+    Comme pour le réseau : le benchmark ne touche pas à l'état partagé par l'application
+    qui tourne peut-être sur la même machine (réservations disque, métriques agrégées,
+    backend de coordination).
+    """
+    from django.test import override_settings
+
+    from downloader.services import coordination
+
+    tmp = stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_"))
+    stack.enter_context(override_settings(
+        METRICS_MULTIPROC_DIR="",
+        DOWNLOAD_RESERVATIONS_DB=f"{tmp}/reservations.sqlite3",
+        COORDINATION_URL="locmem://",
+    ))
+    # Processus enfant jetable : le backend éventuellement hérité du parent est oublié.
+    coordination._backend = None
+
+
+def _run_scenario(scenario: Scenario, rate: int, iterations: int | None) -> dict[str, Any]:
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases
+
+    iterations = iterations or scenario.iterations
+    with ExitStack() as stack:
+        _guard_network(stack)
+        _isolate_node_state(stack)
+        server = stack.enter_context(FakeMediaServer(rate=rate))
+        if scenario.needs_db:
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            stack.callback(teardown_databases, old_config, verbosity=0)
+
+        op = scenario.setup(stack, server)
+        for _ in range(scenario.warmup):
+            op()
+
+        timings = []
+        total_bytes = 0
+        began = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            total_bytes += op()
+            timings.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - began
+
+    timings.sort()
+    return {
+        "name": scenario.name,
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 3) if elapsed else 0.0,
+        "mb_per_sec": round(total_bytes / elapsed / 1024 / 1024, 3) if elapsed and total_bytes else None,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _child(queue, scenario: Scenario, rate: int, iterations: int | None) -> None:
+    try:
+        queue.put(_run_scenario(scenario, rate, iterations))
+    except BaseException as exc:  # remonté au parent
+        queue.put({"name": scenario.name, "error": f"{type(exc).__name__}: {exc}"})
+
+
+# Durée maximale d'un scénario (secondes) avant d'abandonner le processus enfant.
+SCENARIO_TIMEOUT = 600
+
+
+def run_scenario_isolated(scenario: Scenario, rate: int, iterations: int | None = None,
+                          timeout: float = SCENARIO_TIMEOUT) -> dict[str, Any]:
+    """
+    Chaque scénario tourne dans un processus enfant (fork) : le pic RSS mesuré
+    lui est propre et un scénario ne réchauffe pas les caches du suivant.
+    Un enfant mort sans résultat (OOM, segfault) ou bloqué au-delà de `timeout`
+    donne une erreur pour ce scénario au lieu de bloquer tout le benchmark.
+    """
+    if scenario.requires_ffmpeg and not shutil.which("ffmpeg"):
+        return {"name": scenario.name, "skipped": "ffmpeg introuvable"}
+
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_child, args=(queue, scenario, rate, iterations))
+    process.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                return queue.get(timeout=0.5)
+            except Empty:
+                pass
+            if not process.is_alive():
+                # Le résultat a pu être posté juste avant la sortie.
+                try:
+                    return queue.get(timeout=0.5)
+                except Empty:
+                    return {"name": scenario.name,
+                            "error": f"processus terminé sans résultat (exitcode {process.exitcode})"}
+            if time.monotonic() >= deadline:
+                process.kill()
+                return {"name": scenario.name, "error": f"délai dépassé ({timeout:.0f}s)"}
+    finally:
+        process.join()
+
+
+def environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def run(names: list[str] | None = None, rate: int = 0, iterations: int | None = None,
+        timeout: float = SCENARIO_TIMEOUT) -> dict[str, Any]:
+    scenarios = [s for s in SCENARIOS if not names or s.name in names]
+    return {
+        "environment": environment(),
+        "rate": rate,
+        "results": [run_scenario_isolated(s, rate, iterations, timeout) for s in scenarios],
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Écart relatif (%) par scénario et par indicateur entre deux rapports JSON.
+    Pour les latences et la mémoire, un écart positif est une régression.
+    """
+    before = {r["name"]: r for r in baseline.get("results", [])}
+    rows = []
+    for r in current.get("results", []):
+        old = before.get(r["name"])
+        if not old or "error" in r or "skipped" in r or "error" in old or "skipped" in old:
+            continue
+        row = {"name": r["name"]}
+        for key in ("ops_per_sec", "p50_ms", "p99_ms", "peak_rss_mb"):
+            if old.get(key):
+                row[key] = round((r[key] - old[key]) / old[key] * 100, 1)
+        rows.append(row)
+    return rows
+
+
+def load_report(path: str) -> dict[str, Any]:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
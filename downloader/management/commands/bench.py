@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from downloader.benchmarks import runner
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks hors-ligne (fixtures yt-dlp / API YouTube + serveur média local). "
+        "Ex: python manage.py bench --output bench.json --compare bench-main.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenarios", nargs="*", help="Scénarios à lancer (défaut: tous).")
+        parser.add_argument("--list", action="store_true", help="Liste les scénarios disponibles.")
+        parser.add_argument("--rate", type=float, default=0,
+                            help="Débit du serveur média local en Mo/s (0 = illimité).")
+        parser.add_argument("--iterations", type=int, default=None,
+                            help="Nombre d'itérations (défaut: valeur propre à chaque scénario).")
+        parser.add_argument("--timeout", type=float, default=runner.SCENARIO_TIMEOUT,
+                            help="Durée maximale d'un scénario en secondes (défaut: %(default)s).")
+        parser.add_argument("--output", help="Écrit le rapport JSON dans ce fichier.")
+        parser.add_argument("--compare", help="Rapport JSON de référence (ex: autre commit).")
+
+    def handle(self, *args, **options):
+        names = [s.name for s in runner.SCENARIOS]
+        if options["list"]:
+            for name in names:
+                self.stdout.write(name)
+            return
+
+        unknown = set(options["scenarios"]) - set(names)
+        if unknown:
+            raise CommandError(f"Scénario(s) inconnu(s) : {', '.join(sorted(unknown))}")
+
+        report = runner.run(
+            names=options["scenarios"],
+            rate=int(options["rate"] * 1024 * 1024),
+            iterations=options["iterations"],
+            timeout=options["timeout"],
+        )
+
+        env = report["environment"]
+        self.stdout.write(f"commit {env['commit'] or '?'} — Python {env['python']} — {env['platform']}")
+        self.stdout.write(f"{'scénario':<24}{'ops/s':>10}{'Mo/s':>9}{'p50 ms':>10}{'p99 ms':>10}{'RSS Mo':>9}")
+        for r in report["results"]:
+            if "error" in r or "skipped" in r:
+                self.stdout.write(f"{r['name']:<24}  {r.get('error') or 'ignoré : ' + r['skipped']}")
+                continue
+            mbps = f"{r['mb_per_sec']:.1f}" if r["mb_per_sec"] else "-"
+            self.stdout.write(
+                f"{r['name']:<24}{r['ops_per_sec']:>10.1f}{mbps:>9}{r['p50_ms']:>10.2f}"
+                f"{r['p99_ms']:>10.2f}{r['peak_rss_mb']:>9.1f}"
+            )
+
+        if options["compare"]:
+            baseline = runner.load_report(options["compare"])
+            self.stdout.write(f"\nÉcart vs {baseline['environment'].get('commit') or options['compare']} (%)")
+            for row in runner.compare(report, baseline):
+                deltas = "  ".join(f"{k}={v:+.1f}" for k, v in row.items() if k != "name")
+                self.stdout.write(f"{row['name']:<24}{deltas}")
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=1)
+            self.stdout.write(f"\nRapport écrit dans {options['output']}")
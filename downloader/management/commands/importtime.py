@@ -0,0 +1,89 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from downloader.preload import HEAVY_MODULES
+
+
+# Démarrage simulé d'un worker : application WSGI + URLconf (donc les vues) chargées.
+BOOT_SCRIPT = """
+import json, os, resource, sys, time
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+from config.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot = time.perf_counter() - t0
+if {preload!r}:
+    from downloader.preload import preload_heavy_modules
+    preload_heavy_modules()
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{
+    "boot_ms": round(boot * 1000, 1),
+    "total_ms": round((time.perf_counter() - t0) * 1000, 1),
+    "peak_rss_mb": round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1),
+    "modules": len(sys.modules),
+}}))
+"""
+
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le démarrage d'un worker (python -X importtime) : durée, RSS, "
+        "modules les plus coûteux et dépendances lourdes chargées au boot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=15, help="Nombre de modules à afficher.")
+        parser.add_argument("--preload", action="store_true",
+                            help="Inclut le préchargement du master gunicorn (downloader.preload).")
+        parser.add_argument("--json", action="store_true", help="Sortie JSON (suivi entre commits).")
+
+    def handle(self, *args, **options):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", BOOT_SCRIPT.format(preload=options["preload"])],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "échec")
+
+        report = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        imports = {}
+        for line in proc.stderr.splitlines():
+            match = IMPORTTIME_RE.match(line)
+            if match:
+                self_us, cumulative_us, indent, name = match.groups()
+                imports[name] = (int(cumulative_us), len(indent) // 2)
+
+        # Coût par paquet racine (django, yt_dlp, ...) : l'import le plus externe de chaque
+        # paquet a le temps cumulé le plus élevé. Les paquets imbriqués sont comptés dans leur parent.
+        packages = {}
+        for name, (us, _) in imports.items():
+            root = name.split(".")[0]
+            packages[root] = max(packages.get(root, 0), us)
+        ranked = sorted(packages.items(), key=lambda x: x[1], reverse=True)
+        report["top"] = [{"package": name, "cumulative_ms": round(us / 1000, 1)} for name, us in ranked[:options["top"]]]
+        report["heavy_loaded"] = {name: name in imports for name in HEAVY_MODULES}
+
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=1))
+            return
+
+        self.stdout.write(
+            f"Boot worker : {report['boot_ms']} ms (total {report['total_ms']} ms) — "
+            f"RSS max {report['peak_rss_mb']} Mo — {report['modules']} modules"
+        )
+        self.stdout.write(f"\n{'paquet':<40}{'cumulé ms':>12}")
+        for row in report["top"]:
+            self.stdout.write(f"{row['package']:<40}{row['cumulative_ms']:>12.1f}")
+        self.stdout.write("\nDépendances lourdes chargées :")
+        for name, loaded in report["heavy_loaded"].items():
+            self.stdout.write(f"  {name:<20}{'oui' if loaded else 'non (à la demande)'}")
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from downloader.services.profiling import make_profile_token
+
+
+class Command(BaseCommand):
+    help = "Génère un jeton signé pour forcer le profilage d'une requête."
+
+    def handle(self, *args, **options):
+        token = make_profile_token()
+        self.stdout.write(f"{settings.PROFILING_HEADER}: {token}")
+        self.stdout.write(
+            f"(valide {settings.PROFILING_TOKEN_MAX_AGE}s, ex: curl -H '{settings.PROFILING_HEADER}: {token}' ...)"
+        )
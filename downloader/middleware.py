@@ -0,0 +1,82 @@
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .services import profiling
+
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Profilage opt-in des requêtes (PROFILING_ENABLED=1) :
+    - un échantillon aléatoire (PROFILING_SAMPLE_RATE, ex: 0.01 = 1%)
+    - ou toute requête portant un jeton signé dans l'en-tête PROFILING_HEADER
+      (voir `python manage.py profiling_token`).
+    Chaque profil (cProfile ou piles échantillonnées + requêtes SQL) est écrit dans
+    PROFILING_DIR et consultable dans l'admin (/admin/profiles/).
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.header = "HTTP_" + settings.PROFILING_HEADER.upper().replace("-", "_")
+
+    def should_profile(self, request) -> bool:
+        token = request.META.get(self.header)
+        if token:
+            return profiling.is_valid_profile_token(token)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return rate > 0 and random.random() < rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        collector = profiling.make_collector()
+        recorder = profiling.QueryRecorder()
+
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(recorder))
+
+            start = time.perf_counter()
+            started = collector.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                collector.stop()
+            duration = time.perf_counter() - start
+
+        # Un autre profil cProfile est déjà en cours dans ce processus : on laisse passer.
+        if not started:
+            return response
+
+        match = getattr(request, "resolver_match", None)
+        slowest = sorted(recorder.queries, key=lambda q: q["ms"], reverse=True)[:10]
+        meta = {
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else "",
+            "status": response.status_code,
+            "duration_ms": round(duration * 1000, 3),
+            "mode": settings.PROFILING_MODE,
+            "query_count": len(recorder.queries),
+            "query_ms": recorder.total_ms,
+            "slowest_queries": slowest,
+        }
+        # Le profilage ne doit jamais faire échouer une requête réussie
+        # (disque plein, PROFILING_DIR en lecture seule, rotation concurrente...).
+        try:
+            profiling.save_profile(collector, meta)
+        except Exception:
+            logger.exception("Échec de l'enregistrement du profil de %s", request.path)
+        return response
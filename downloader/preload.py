@@ -0,0 +1,46 @@
+import gc
+from importlib import import_module
+
+
+# Dépendances lourdes importées à la demande par les vues / services.
+HEAVY_MODULES = ("yt_dlp", "yt_dlp.utils", "user_agents", "requests", "PIL.Image")
+
+
+def preload_heavy_modules() -> list[str]:
+    """
+    Importe (et « réchauffe ») les dépendances lourdes dans le processus courant.
+
+    Appelée dans le master gunicorn avant le fork (voir gunicorn.conf.py) : les workers
+    héritent alors de ces pages mémoire en copy-on-write au lieu de les recharger chacun.
+    Retourne la liste des modules effectivement chargés.
+    """
+    loaded = []
+    for name in HEAVY_MODULES:
+        try:
+            import_module(name)
+        except ImportError:
+            continue
+        loaded.append(name)
+
+    # ua-parser compile ses expressions régulières au premier appel.
+    if "user_agents" in loaded:
+        from user_agents import parse
+
+        parse("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+    # Extracteurs yt-dlp chargés paresseusement : on résout celui de YouTube.
+    if "yt_dlp" in loaded:
+        from yt_dlp.extractor import get_info_extractor
+
+        get_info_extractor("Youtube")
+
+    return loaded
+
+
+def freeze_for_fork() -> None:
+    """
+    Sort les objets déjà chargés du suivi du GC : ses passages dans les workers
+    ne réécrivent plus ces pages (qui restent partagées avec le master).
+    """
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+
+from .metrics import record_cache
+
+
+TIMESTAMP_RE = re.compile(r"^(?:(\d+):)?(?:(\d+):)?(\d+(?:[.,]\d+)?)$")
+
+
+def parse_timestamp(value: str) -> float | None:
+    """
+    "90", "1:30", "01:02:03", "12.5" -> secondes. Vide -> None.
+    """
+    value = (value or "").strip()
+    if not value:
+        return None
+    match = TIMESTAMP_RE.match(value)
+    if not match:
+        raise ValueError(f"Temps invalide : « {value} » (format attendu : 1:30 ou 01:02:03).")
+    parts = [float(p.replace(",", ".")) for p in match.groups() if p is not None]
+    # Seul le premier champ peut dépasser 59 ("90" ou "75:00", mais pas "1:75").
+    if any(p >= 60 for p in parts[1:]):
+        raise ValueError(f"Temps invalide : « {value} » (minutes et secondes < 60).")
+    seconds = 0.0
+    for p in parts:
+        seconds = seconds * 60 + p
+    return seconds
+
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(seconds)
+    h, rest = divmod(seconds, 3600)
+    m, s = divmod(rest, 60)
+    return f"{h}:{m:02d}:{s:02d}" if h else f"{m}:{s:02d}"
+
+
+@dataclass(frozen=True)
+class ClipPlan:
+    start: float
+    end: float
+    # False : copie des flux sans ré-encodage, coupe calée sur l'image-clé précédant `start`
+    # (rapide, le clip peut commencer un peu plus tôt). True : coupe exacte (ré-encodage).
+    precise: bool
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def label(self) -> str:
+        return f"{format_timestamp(self.start)}–{format_timestamp(self.end)}"
+
+
+def plan_clip(info: dict[str, Any], start: str, end: str, precise: bool = False) -> ClipPlan | None:
+    """
+    Construit le plan de découpe à partir des champs du formulaire.
+    Retourne None si aucun extrait n'est demandé (ou s'il couvre toute la vidéo).
+    Lève ValueError avec un message affichable sinon.
+    """
+    start_s = parse_timestamp(start)
+    end_s = parse_timestamp(end)
+    if start_s is None and end_s is None:
+        return None
+
+    duration = float(info.get("duration") or 0)
+    start_s = start_s or 0.0
+    if end_s is None or (duration and end_s > duration):
+        end_s = duration or None
+    if end_s is None:
+        raise ValueError("Durée de la vidéo inconnue : précise un temps de fin.")
+    if end_s <= start_s:
+        raise ValueError("Le temps de fin doit être après le temps de début.")
+    if duration and start_s <= 0 and end_s >= duration:
+        return None
+
+    # Sous quelques secondes, une coupe sur image-clé peut donner un fichier vide ou
+    # nettement plus long que demandé (GOP YouTube ~2-5s) : on coupe précisément.
+    if end_s - start_s < settings.CLIP_MIN_COPY_SECONDS:
+        precise = True
+    return ClipPlan(start=start_s, end=end_s, precise=precise)
+
+
+def clip_ydl_options(plan: ClipPlan) -> dict[str, Any]:
+    """
+    Options yt-dlp pour ne télécharger que la section demandée (bande passante et disque
+    proportionnels à la durée du clip, pas de la vidéo).
+    """
+    from yt_dlp.utils import download_range_func
+
+    return {
+        "download_ranges": download_range_func(None, [(plan.start, plan.end)]),
+        "force_keyframes_at_cuts": plan.precise,
+    }
+
+
+# --------------------------------------------------------------------------------------
+# Cache disque des clips : clé (video_id, format, plage)
+# --------------------------------------------------------------------------------------
+def clip_cache_key(video_id: str, ytdlp_format: str, plan: ClipPlan) -> str:
+    raw = f"{video_id}|{ytdlp_format}|{plan.start:.3f}|{plan.end:.3f}|{int(plan.precise)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _cache_root() -> Path:
+    path = Path(settings.CLIP_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_cached_clip(key: str) -> Path | None:
+    entry = _cache_root() / key
+    try:
+        files = [p for p in entry.iterdir() if p.is_file()]
+        os.utime(entry)  # LRU : l'entrée redevient la plus récente
+    except FileNotFoundError:  # absente, ou évincée à l'instant par un autre worker
+        files = []
+    record_cache("clip", bool(files))
+    return files[0] if files else None
+
+
+def store_clip(key: str, filepath: str) -> Path:
+    """
+    Déplace le clip produit dans le cache et retourne son nouveau chemin.
+    """
+    root = _cache_root()
+    staging = Path(tempfile.mkdtemp(prefix=".tmp_", dir=root))
+    target = root / key
+    try:
+        shutil.move(filepath, staging / os.path.basename(filepath))
+        os.replace(staging, target)
+    except OSError:
+        # Entrée déjà créée par une requête concurrente : on garde la sienne.
+        shutil.rmtree(staging, ignore_errors=True)
+        if not target.is_dir():
+            raise
+    stored = next(p for p in target.iterdir() if p.is_file())
+    _evict(root, settings.CLIP_CACHE_MAX_BYTES, keep=key)
+    return stored
+
+
+def _entry_size(entry: Path) -> int:
+    return sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+
+
+def _evict(root: Path, max_bytes: int, keep: str) -> None:
+    # Un autre worker peut évincer en même temps : les entrées disparues sont ignorées.
+    entries = []
+    for entry in root.iterdir():
+        if not entry.is_dir() or entry.name.startswith(".tmp_") or entry.name == keep:
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, _entry_size(entry), entry))
+        except FileNotFoundError:
+            continue
+
+    try:
+        kept = _entry_size(root / keep)
+    except FileNotFoundError:
+        kept = 0
+    total = sum(size for _, size, _ in entries) + kept
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
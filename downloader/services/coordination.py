@@ -0,0 +1,471 @@
+from __future__ import annotations
+
+import os
+import pickle
+import select
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+
+
+class LockTimeout(Exception):
+    pass
+
+
+class Backend:
+    """
+    Backend de coordination partagé entre threads / processus / machines.
+    Sert de base au cache des métadonnées, aux verrous et aux files de tâches.
+
+    Valeurs brutes en bytes ; get_object / set_object sérialisent via pickle.
+    """
+
+    def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Écrit la clé seulement si elle n'existe pas. Retourne True si écrite."""
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def delete_if_equals(self, key: str, value: bytes) -> bool:
+        """Supprime la clé seulement si elle vaut `value` (libération sûre d'un verrou)."""
+        raise NotImplementedError
+
+    def push(self, queue: str, value: bytes) -> None:
+        raise NotImplementedError
+
+    def pop(self, queues: list[str], timeout: float) -> tuple[str, bytes] | None:
+        """
+        Retire l'élément le plus ancien de la première file non vide de `queues`
+        (ordre = priorité), en attendant au plus `timeout` secondes.
+        """
+        raise NotImplementedError
+
+    def qsize(self, queue: str) -> int:
+        raise NotImplementedError
+
+    # ----------------------------------------------------------------------------------
+    def get_object(self, key: str) -> Any | None:
+        raw = self.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set_object(self, key: str, value: Any, ttl: float | None = None) -> None:
+        self.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl)
+
+    @contextmanager
+    def lock(self, name: str, ttl: float, timeout: float = 0) -> Iterator[None]:
+        """
+        Verrou exclusif (expirant après `ttl` s si son détenteur disparaît).
+        timeout=0 : échec immédiat (LockTimeout) si déjà pris.
+        """
+        key = f"lock:{name}"
+        token = uuid.uuid4().hex.encode()
+        deadline = time.monotonic() + timeout
+        while not self.add(key, token, ttl):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(name)
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.delete_if_equals(key, token)
+
+
+# --------------------------------------------------------------------------------------
+# Mémoire locale (dev, un seul processus)
+# --------------------------------------------------------------------------------------
+class LocMemBackend(Backend):
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+        self._queues: dict[str, deque[bytes]] = {}
+        self._cond = threading.Condition()
+
+    def _live(self, key: str) -> bytes | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _expiry(self, ttl: float | None) -> float | None:
+        return time.monotonic() + ttl if ttl else None
+
+    def get(self, key):
+        with self._cond:
+            return self._live(key)
+
+    def set(self, key, value, ttl=None):
+        with self._cond:
+            self._data[key] = (value, self._expiry(ttl))
+
+    def add(self, key, value, ttl=None):
+        with self._cond:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (value, self._expiry(ttl))
+            return True
+
+    def delete(self, key):
+        with self._cond:
+            self._data.pop(key, None)
+
+    def delete_if_equals(self, key, value):
+        with self._cond:
+            if self._live(key) != value:
+                return False
+            del self._data[key]
+            return True
+
+    def push(self, queue, value):
+        with self._cond:
+            self._queues.setdefault(queue, deque()).append(value)
+            self._cond.notify_all()
+
+    def pop(self, queues, timeout):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for name in queues:
+                    items = self._queues.get(name)
+                    if items:
+                        return name, items.popleft()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def qsize(self, queue):
+        with self._cond:
+            return len(self._queues.get(queue) or ())
+
+
+# --------------------------------------------------------------------------------------
+# SQLite (fichier local : partagé entre les workers gunicorn d'une même machine)
+# --------------------------------------------------------------------------------------
+class SQLiteBackend(Backend):
+    POLL_INTERVAL = 0.1
+    # Les clés expirées (infos pickle de plusieurs centaines de Ko, lots, verrous) sont
+    # purgées au plus une fois par intervalle et par processus, lors d'une écriture.
+    PURGE_INTERVAL = 60
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._next_purge = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL);
+                CREATE TABLE IF NOT EXISTS queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, value BLOB NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS queue_name_id ON queue (name, id);
+            """)
+
+    def _conn(self) -> sqlite3.Connection:
+        # Une connexion par thread et par processus (jamais partagée après un fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _expiry(self, ttl):
+        return time.time() + ttl if ttl else None
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires IS NULL OR expires > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, value, ttl=None):
+        self._maybe_purge()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, self._expiry(ttl))
+        )
+
+    def add(self, key, value, ttl=None):
+        self._maybe_purge()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires IS NOT NULL AND expires <= ?", (key, time.time()))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires) VALUES (?, ?, ?)", (key, value, self._expiry(ttl))
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def delete_if_equals(self, key, value):
+        cur = self._conn().execute("DELETE FROM kv WHERE key = ? AND value = ?", (key, value))
+        return cur.rowcount == 1
+
+    def push(self, queue, value):
+        self._conn().execute("INSERT INTO queue (name, value) VALUES (?, ?)", (queue, value))
+
+    def _pop_once(self, queues):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in queues:
+                row = conn.execute(
+                    "SELECT id, value FROM queue WHERE name = ? ORDER BY id LIMIT 1", (name,)
+                ).fetchone()
+                if row:
+                    conn.execute("DELETE FROM queue WHERE id = ?", (row[0],))
+                    conn.execute("COMMIT")
+                    return name, row[1]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return None
+
+    def pop(self, queues, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            item = self._pop_once(queues)
+            if item is not None or time.monotonic() >= deadline:
+                return item
+            time.sleep(self.POLL_INTERVAL)
+
+    def qsize(self, queue):
+        return self._conn().execute("SELECT COUNT(*) FROM queue WHERE name = ?", (queue,)).fetchone()[0]
+
+    def purge_expired(self) -> None:
+        self._conn().execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (time.time(),))
+
+    def _maybe_purge(self) -> None:
+        now = time.monotonic()
+        if now < self._next_purge:
+            return
+        self._next_purge = now + self.PURGE_INTERVAL
+        self.purge_expired()
+
+
+# --------------------------------------------------------------------------------------
+# Protocole Redis (RESP2) : plusieurs machines derrière le load balancer
+# --------------------------------------------------------------------------------------
+class RedisError(Exception):
+    pass
+
+
+class RedisSendError(ConnectionError):
+    """Échec avant l'envoi complet de la commande : le serveur ne l'a pas exécutée."""
+
+
+# Suppression atomique « si égal » (libération de verrou), exécutée côté serveur.
+COMPARE_AND_DELETE = (
+    "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+)
+
+
+class _RedisConnection:
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+
+    def close(self) -> None:
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+    def is_usable(self) -> bool:
+        """
+        False si le serveur a fermé la connexion (redémarrage, idle timeout) : elle est
+        alors lisible sans qu'aucune commande ne soit en attente de réponse.
+        """
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return not readable
+        except (OSError, ValueError):
+            return False
+
+    def execute(self, *args, timeout: float | None = None):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            self.sock.settimeout(timeout)
+            self.sock.sendall(b"".join(parts))
+        except OSError as exc:
+            # Une commande partiellement reçue n'est jamais exécutée par Redis.
+            raise RedisSendError(str(exc)) from exc
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Connexion Redis fermée")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            n = int(rest)
+            if n < 0:
+                return None
+            data = self.reader.read(n + 2)
+            return data[:-2]
+        if kind == b"*":
+            n = int(rest)
+            return None if n < 0 else [self._read() for _ in range(n)]
+        raise RedisError(f"Réponse RESP inattendue : {line!r}")
+
+
+class RedisBackend(Backend):
+    """
+    Client RESP minimal (sans dépendance) : GET/SET/DEL/EVAL/LPUSH/BRPOP/LLEN.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: str | None = None, prefix: str = "appolon:", timeout: float = 5):
+        self.host, self.port, self.db, self.password = host, port, db, password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> _RedisConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and not conn.is_usable():
+            self._reset()
+            conn = None
+        if conn is None or self._local.pid != os.getpid():
+            conn = _RedisConnection(self.host, self.port, self.timeout)
+            if self.password:
+                conn.execute("AUTH", self.password, timeout=self.timeout)
+            if self.db:
+                conn.execute("SELECT", self.db, timeout=self.timeout)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _execute(self, *args, timeout: float | None = None, idempotent: bool = True):
+        """
+        Une seule nouvelle tentative si la connexion est coupée : toujours si la commande
+        n'a pas été envoyée, sinon seulement si la rejouer est sans effet (`idempotent`).
+        LPUSH ou BRPOP rejoués après une réponse perdue dupliqueraient / perdraient un élément.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            return self._connection().execute(*args, timeout=timeout)
+        except RedisSendError:
+            self._reset()
+        except (OSError, ConnectionError):
+            self._reset()
+            if not idempotent:
+                raise
+        return self._connection().execute(*args, timeout=timeout)
+
+    def _reset(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _k(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key):
+        return self._execute("GET", self._k(key))
+
+    def set(self, key, value, ttl=None):
+        args = ["SET", self._k(key), value]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        self._execute(*args)
+
+    def add(self, key, value, ttl=None):
+        args = ["SET", self._k(key), value, "NX"]
+        if ttl:
+            args += ["PX", int(ttl * 1000)]
+        return self._execute(*args, idempotent=False) == "OK"
+
+    def delete(self, key):
+        self._execute("DEL", self._k(key))
+
+    def delete_if_equals(self, key, value):
+        return self._execute("EVAL", COMPARE_AND_DELETE, 1, self._k(key), value) == 1
+
+    def push(self, queue, value):
+        self._execute("LPUSH", self._k(queue), value, idempotent=False)
+
+    def pop(self, queues, timeout):
+        keys = [self._k(q) for q in queues]
+        # BRPOP bloque côté serveur : le timeout socket doit le dépasser.
+        reply = self._execute("BRPOP", *keys, max(timeout, 0.01), timeout=timeout + self.timeout, idempotent=False)
+        if not reply:
+            return None
+        return reply[0].decode()[len(self.prefix):], reply[1]
+
+    def qsize(self, queue):
+        return self._execute("LLEN", self._k(queue))
+
+
+# --------------------------------------------------------------------------------------
+# Sélection du backend
+# --------------------------------------------------------------------------------------
+def backend_from_url(url: str) -> Backend:
+    """
+    locmem://                          mémoire du processus (dev)
+    sqlite:///chemin/vers/coord.db     fichier partagé par les workers d'une machine
+    redis://[:motdepasse@]hôte:port/0  plusieurs machines
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "locmem":
+        return LocMemBackend()
+    if parsed.scheme == "sqlite":
+        return SQLiteBackend(unquote(parsed.path))
+    if parsed.scheme == "redis":
+        return RedisBackend(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(parsed.path.strip("/") or 0),
+            password=unquote(parsed.password) if parsed.password else None,
+        )
+    raise ValueError(f"COORDINATION_URL non supportée : {url}")
+
+
+_backend: Backend | None = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> Backend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = backend_from_url(settings.COORDINATION_URL)
+    return _backend
@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import fcntl
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+
+# Buckets (secondes) adaptés à nos opérations : extraction yt-dlp (1-10s),
+# téléchargement / fusion FFmpeg (jusqu'à plusieurs minutes).
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Buckets (octets) : de 256 Ko à 4 Go.
+SIZE_BUCKETS = tuple(256 * 1024 * 4 ** i for i in range(10))
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: dict[tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name}: attendu {len(self.labelnames)} labels, reçu {len(values)}")
+        EXPORTER.ensure_started()
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name}: utiliser .labels(...) ({', '.join(self.labelnames)})")
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    # Les valeurs sont manipulées sous forme de données simples (JSON) pour pouvoir être
+    # agrégées entre workers : snapshot() -> fichiers -> merge() -> render().
+    def snapshot(self) -> dict[tuple[str, ...], Any]:
+        return {key: self._snapshot_child(child) for key, child in list(self._children.items())}
+
+    def _snapshot_child(self, child):
+        return child.value
+
+    def merge(self, a, b):
+        return a + b
+
+    def render(self, data: dict[tuple[str, ...], Any] | None = None) -> list[str]:
+        data = self.snapshot() if data is None else data
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(data.items()):
+            lines.extend(self._render_child(key, value))
+        return lines
+
+    def _render_child(self, key, value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "updated", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.updated = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+            self.updated = time.time()
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+            self.updated = time.time()
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+        self.updated = time.time()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """
+    Entre workers, la valeur retenue est la plus récemment écrite (nos jauges décrivent
+    un état partagé : profondeur des files du backend, attente d'admission de la machine).
+    """
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def _snapshot_child(self, child):
+        return [child.value, child.updated]
+
+    def merge(self, a, b):
+        return a if a[1] >= b[1] else b
+
+    def _render_child(self, key, value) -> list[str]:
+        return super()._render_child(key, value[0])
+
+    def inc(self, amount: float = 1) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _snapshot_child(self, child):
+        with child._lock:
+            return [list(child.counts), child.sum, child.count]
+
+    def merge(self, a, b):
+        return [[x + y for x, y in zip(a[0], b[0])], a[1] + b[1], a[2] + b[2]]
+
+    def _render_child(self, key, value) -> list[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrique déjà enregistrée : {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self) -> dict[str, list]:
+        """Valeurs courantes, sérialisables en JSON : {nom: [[labels, valeur], ...]}."""
+        return {
+            name: [[list(key), value] for key, value in metric.snapshot().items()]
+            for name, metric in list(self._metrics.items())
+        }
+
+    def merge(self, snapshots: list[dict[str, list]], gauges: bool = True) -> dict[str, dict]:
+        merged: dict[str, dict] = {}
+        for snap in snapshots:
+            for name, children in snap.items():
+                metric = self._metrics.get(name)
+                if metric is None or (isinstance(metric, Gauge) and not gauges):
+                    continue
+                target = merged.setdefault(name, {})
+                for key, value in children:
+                    key = tuple(key)
+                    target[key] = metric.merge(target[key], value) if key in target else value
+        return merged
+
+    def render(self, data: dict[str, dict] | None = None) -> str:
+        lines = []
+        for name, metric in list(self._metrics.items()):
+            lines.extend(metric.render(None if data is None else data.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# --------------------------------------------------------------------------------------
+# Agrégation entre workers gunicorn (METRICS_MULTIPROC_DIR)
+# --------------------------------------------------------------------------------------
+class MultiprocessExporter:
+    """
+    Chaque processus écrit ses valeurs dans `<dir>/<pid>-<id>.json` (thread d'arrière-plan,
+    toutes les FLUSH_INTERVAL s) ; /metrics fusionne les fichiers de tous les workers de
+    la machine :
+    - compteurs / histogrammes : somme, workers morts compris (ils sont repliés dans
+      archive.json pour ne jamais faire « redescendre » un compteur)
+    - jauges : workers vivants seulement, valeur la plus récente
+    Sans dossier configuré, chaque processus n'expose que ses propres valeurs.
+    """
+
+    FLUSH_INTERVAL = 1.0
+    ARCHIVE = "archive.json"
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def directory(self) -> str:
+        from django.conf import settings
+
+        return getattr(settings, "METRICS_MULTIPROC_DIR", "")
+
+    def ensure_started(self) -> None:
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Nom unique par processus : un pid réutilisé n'écrase pas le fichier d'un mort.
+            self._filename = f"{self._pid}-{uuid.uuid4().hex[:8]}.json"
+            self._last = None
+            try:
+                enabled = bool(self.directory())
+            except Exception:  # settings non configurés (script hors Django)
+                enabled = False
+            if enabled:
+                threading.Thread(target=self._run, name="metrics-flush", daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except OSError:
+                pass
+
+    def flush(self) -> None:
+        directory = self.directory()
+        data = json.dumps(self.registry.snapshot())
+        if not directory or (directory, data) == self._last:
+            return
+        os.makedirs(directory, exist_ok=True)
+        _atomic_write(os.path.join(directory, self._filename), data)
+        self._last = (directory, data)
+
+    def collect(self) -> dict[str, dict]:
+        self.ensure_started()
+        self.flush()
+        directory = self.directory()
+        with _file_lock(os.path.join(directory, ".lock")):
+            self._archive_dead(directory)
+            live = []
+            for name in os.listdir(directory):
+                if name.endswith(".json") and name != self.ARCHIVE:
+                    snap = _read_json(os.path.join(directory, name))
+                    if snap is not None:
+                        live.append(snap)
+            archive = _read_json(os.path.join(directory, self.ARCHIVE)) or {}
+
+        merged = self.registry.merge(live)
+        for name, values in self.registry.merge([archive], gauges=False).items():
+            target = merged.setdefault(name, {})
+            metric = self.registry._metrics[name]
+            for key, value in values.items():
+                target[key] = metric.merge(target[key], value) if key in target else value
+        return merged
+
+    def _archive_dead(self, directory: str) -> None:
+        dead = [
+            name for name in os.listdir(directory)
+            if name.endswith(".json") and name != self.ARCHIVE and not _pid_alive(int(name.split("-")[0]))
+        ]
+        if not dead:
+            return
+        archive_path = os.path.join(directory, self.ARCHIVE)
+        snaps = [_read_json(archive_path) or {}] + [_read_json(os.path.join(directory, n)) or {} for n in dead]
+        merged = self.registry.merge(snaps, gauges=False)
+        archive = {name: [[list(k), v] for k, v in values.items()] for name, values in merged.items()}
+        _atomic_write(archive_path, json.dumps(archive))
+        for name in dead:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _atomic_write(path: str, data: str) -> None:
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+@contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    with open(path, "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+EXPORTER = MultiprocessExporter(REGISTRY)
+
+
+def counter(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (),
+              buckets: tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --------------------------------------------------------------------------------------
+# Métriques de l'application
+# --------------------------------------------------------------------------------------
+EXTRACT_SECONDS = histogram(
+    "appolon_ytdlp_extract_seconds", "Durée de l'extraction des métadonnées yt-dlp.", ("outcome",),
+)
+DOWNLOAD_SECONDS = histogram(
+    "appolon_download_seconds", "Durée du téléchargement yt-dlp (hors fusion).", ("mode", "outcome"),
+)
+MERGE_SECONDS = histogram(
+    "appolon_ffmpeg_merge_seconds", "Durée de la fusion audio/vidéo FFmpeg.",
+)
+FILE_SIZE_BYTES = histogram(
+    "appolon_file_size_bytes", "Taille des fichiers produits.", ("mode",), buckets=SIZE_BUCKETS,
+)
+BYTES_SERVED = counter(
+    "appolon_bytes_served_total", "Octets envoyés aux clients.", ("mode",),
+)
+YOUTUBE_API_SECONDS = histogram(
+    "appolon_youtube_api_seconds", "Latence de l'API YouTube Data v3.", ("endpoint", "outcome"),
+)
+CACHE_REQUESTS = counter(
+    "appolon_cache_requests_total", "Accès aux caches (hit/miss).", ("cache", "result"),
+)
+QUEUE_DEPTH = gauge(
+    "appolon_queue_depth", "Nombre de tâches en attente.", ("queue",),
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render_latest() -> str:
+    """
+    Rend toutes les métriques au format texte Prometheus (version 0.0.4), agrégées sur
+    les workers de la machine si METRICS_MULTIPROC_DIR est défini.
+    """
+    if not EXPORTER.directory():
+        return REGISTRY.render()
+    return REGISTRY.render(EXPORTER.collect())
+
+
+def reset_multiprocess_dir(directory: str) -> None:
+    """
+    Vide le dossier d'agrégation (démarrage du master gunicorn : les fichiers d'une
+    exécution précédente ne doivent pas être comptés).
+    """
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                os.unlink(path)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+from .coordination import get_backend
+from .metrics import QUEUE_DEPTH
+from .ytdlp_service import get_video_info, is_video_info_cached
+
+
+logger = logging.getLogger(__name__)
+
+BATCH_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class Prefetcher:
+    """
+    Préchargement en arrière-plan des métadonnées yt-dlp des résultats de recherche.
+
+    - une file par rang dans la page (le 1er résultat passe en premier), stockées dans le
+      backend de coordination : avec SQLite / Redis, n'importe quel worker les consomme
+    - file bornée (PREFETCH_QUEUE_SIZE) : au-delà, les nouvelles tâches sont ignorées
+    - les tâches sont regroupées par « lot » (une page de résultats) : `cancel(batch)`
+      abandonne les tâches pas encore démarrées quand l'utilisateur quitte la page
+    - les threads sont démarrés à la première utilisation (jamais dans le master gunicorn)
+    """
+
+    POP_TIMEOUT = 5
+
+    def __init__(self, workers: int, maxsize: int, depth: int):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queues = [f"prefetch:{rank}" for rank in range(depth)]
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _ensure_started(self) -> None:
+        # Après un fork, les threads du parent n'existent plus : on repart de zéro.
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._run, name=f"prefetch-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _batch_key(self, batch: str) -> str:
+        return f"prefetch:batch:{batch}"
+
+    def depth(self) -> int:
+        return sum(get_backend().qsize(q) for q in self.queues)
+
+    def submit(self, urls: list[str]) -> str:
+        """
+        Met en file l'extraction des `urls` (dans l'ordre de priorité) et retourne l'id du lot.
+        """
+        self._ensure_started()
+        backend = get_backend()
+        batch = uuid.uuid4().hex
+
+        depth = self.depth()
+        todo = [(rank, url) for rank, url in enumerate(urls[:len(self.queues)]) if not is_video_info_cached(url)]
+        todo = todo[:max(self.maxsize - depth, 0)]
+        if todo:
+            backend.set(self._batch_key(batch), b"1", settings.PREFETCH_BATCH_TTL)
+            for rank, url in todo:
+                backend.push(self.queues[rank], json.dumps({"batch": batch, "url": url}).encode())
+        QUEUE_DEPTH.labels("prefetch").set(depth + len(todo))
+        return batch
+
+    def cancel(self, batch: str) -> None:
+        get_backend().delete(self._batch_key(batch))
+
+    def _run(self) -> None:
+        backend = get_backend()
+        while True:
+            try:
+                item = backend.pop(self.queues, self.POP_TIMEOUT)
+                if item is None:
+                    continue
+                QUEUE_DEPTH.labels("prefetch").set(self.depth())
+                task = json.loads(item[1])
+                if backend.get(self._batch_key(task["batch"])) is None:
+                    continue  # lot annulé ou expiré
+                get_video_info(task["url"])
+            except Exception as exc:
+                logger.info("Préchargement échoué : %s", exc)
+                time.sleep(1)  # backend indisponible : on évite de boucler à vide
+
+
+_prefetcher = Prefetcher(settings.PREFETCH_WORKERS, settings.PREFETCH_QUEUE_SIZE, settings.PREFETCH_TOP_N)
+
+
+def prefetch_search_results(items: list[dict]) -> str | None:
+    """
+    Lance le préchargement des PREFETCH_TOP_N premiers résultats de `search_youtube_videos`.
+    """
+    if not settings.PREFETCH_ENABLED or not items:
+        return None
+    urls = [f"https://www.youtube.com/watch?v={it['video_id']}" for it in items[:settings.PREFETCH_TOP_N]]
+    return _prefetcher.submit(urls)
+
+
+def cancel_prefetch(batch: str | None) -> None:
+    # L'id vient d'un paramètre GET : seuls les ids de lot (uuid4 hex) sont acceptés.
+    if batch and BATCH_ID_RE.match(batch):
+        _prefetcher.cancel(batch)
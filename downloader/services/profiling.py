@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from django.conf import settings
+from django.core import signing
+
+
+SIGNING_SALT = "downloader.profiling"
+SUMMARY_SUFFIX = ".json"
+
+
+def make_profile_token() -> str:
+    """
+    Jeton signé à mettre dans l'en-tête PROFILING_HEADER pour forcer le profilage
+    d'une requête (valide PROFILING_TOKEN_MAX_AGE secondes).
+    """
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign("profile")
+
+
+def is_valid_profile_token(token: str) -> bool:
+    try:
+        value = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return False
+    return value == "profile"
+
+
+# --------------------------------------------------------------------------------------
+# Collecteurs
+# --------------------------------------------------------------------------------------
+class CProfileCollector:
+    ext = ".prof"
+
+    # cProfile ne supporte qu'un profileur actif par processus.
+    _active = threading.Lock()
+
+    def __init__(self):
+        self._profiler = cProfile.Profile()
+        self._owned = False
+
+    def start(self) -> bool:
+        self._owned = self._active.acquire(blocking=False)
+        if self._owned:
+            self._profiler.enable()
+        return self._owned
+
+    def stop(self) -> None:
+        if self._owned:
+            self._profiler.disable()
+            self._active.release()
+
+    def dump(self, path: Path) -> list[str]:
+        self._profiler.dump_stats(str(path))
+        out = io.StringIO()
+        stats = pstats.Stats(self._profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(25)
+        return out.getvalue().splitlines()
+
+
+class StackSampler:
+    """
+    Échantillonneur « wall-clock » : un thread relève la pile du thread de la requête
+    toutes les PROFILING_SAMPLE_INTERVAL secondes. Sortie au format « collapsed stacks »
+    (compatible flamegraph.pl / speedscope).
+    """
+    ext = ".stacks"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> bool:
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, path: Path) -> list[str]:
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, count in self.samples.most_common():
+                fh.write(f"{stack} {count}\n")
+        leaves = Counter()
+        for stack, count in self.samples.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [f"{100 * n / total:5.1f}%  {frame}" for frame, n in leaves.most_common(25)]
+
+
+def make_collector():
+    if settings.PROFILING_MODE == "sample":
+        return StackSampler(settings.PROFILING_SAMPLE_INTERVAL)
+    return CProfileCollector()
+
+
+@dataclass
+class QueryRecorder:
+    """
+    `execute_wrapper` Django : compte et chronomètre les requêtes SQL.
+    """
+    queries: list[dict[str, Any]] = field(default_factory=list)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                "alias": context["connection"].alias,
+                "sql": sql,
+                "ms": round((time.perf_counter() - start) * 1000, 3),
+            })
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(q["ms"] for q in self.queries), 3)
+
+
+# --------------------------------------------------------------------------------------
+# Stockage (dossier local avec rotation)
+# --------------------------------------------------------------------------------------
+def profile_dir() -> Path:
+    path = Path(settings.PROFILING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def save_profile(collector, summary: dict[str, Any]) -> str:
+    """
+    Écrit le profil brut + un résumé JSON, puis applique la rotation.
+    Retourne l'identifiant du profil.
+    """
+    directory = profile_dir()
+    profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    raw_name = profile_id + collector.ext
+
+    summary = dict(summary, id=profile_id, raw_file=raw_name, top=collector.dump(directory / raw_name))
+    with open(directory / (profile_id + SUMMARY_SUFFIX), "w", encoding="utf-8") as fh:
+        json.dump(summary, fh, ensure_ascii=False, indent=1)
+
+    rotate(directory, settings.PROFILING_MAX_PROFILES)
+    return profile_id
+
+
+def rotate(directory: Path, keep: int) -> None:
+    summaries = sorted(directory.glob("*" + SUMMARY_SUFFIX))
+    for old in summaries[:max(len(summaries) - keep, 0)]:
+        for path in directory.glob(old.stem + ".*"):
+            path.unlink(missing_ok=True)
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    directory = Path(settings.PROFILING_DIR)
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for path in sorted(directory.glob("*" + SUMMARY_SUFFIX), reverse=True):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                profiles.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def get_profile_path(filename: str) -> Path | None:
+    """
+    Chemin d'un fichier brut, uniquement s'il appartient bien au dossier de profils.
+    """
+    directory = Path(settings.PROFILING_DIR).resolve()
+    path = (directory / filename).resolve()
+    if path.parent != directory or path.suffix not in (CProfileCollector.ext, StackSampler.ext):
+        return None
+    return path if path.is_file() else None
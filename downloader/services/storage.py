@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from django.conf import settings
+
+from .metrics import QUEUE_DEPTH
+
+
+class InsufficientStorage(Exception):
+    pass
+
+
+# --------------------------------------------------------------------------------------
+# Estimation de la taille d'un téléchargement
+# --------------------------------------------------------------------------------------
+def estimate_format_size(fmt: dict[str, Any], duration: float) -> int | None:
+    """
+    Taille d'un format yt-dlp : filesize, sinon filesize_approx, sinon tbr (kbit/s) * durée.
+    """
+    size = fmt.get("filesize") or fmt.get("filesize_approx")
+    if size:
+        return int(size)
+    tbr = fmt.get("tbr") or ((fmt.get("vbr") or 0) + (fmt.get("abr") or 0))
+    if tbr and duration:
+        return int(tbr * 1000 / 8 * duration)
+    return None
+
+
+def _best_audio(formats: list[dict[str, Any]]) -> dict[str, Any] | None:
+    audio = [f for f in formats if f.get("vcodec") == "none" and f.get("acodec") not in (None, "none")]
+    return max(audio, key=lambda f: f.get("abr") or f.get("tbr") or 0, default=None)
+
+
+def estimate_output_size(info: dict[str, Any], format_id: str, mode: str, clip=None) -> int:
+    """
+    Espace disque nécessaire (octets) pour produire le fichier demandé.
+    - vidéo sans audio : + meilleur audio, et x2 pendant la fusion FFmpeg
+      (les fichiers source restent sur le disque jusqu'à la fin de la fusion)
+    - extrait (ClipPlan) : au prorata de la durée du clip
+    Format inconnu : DOWNLOAD_SIZE_FALLBACK.
+    """
+    formats = info.get("formats") or []
+    duration = float(info.get("duration") or 0)
+    fmt = next((f for f in formats if str(f.get("format_id")) == format_id), None)
+
+    size = estimate_format_size(fmt, duration) if fmt else None
+    if size is None:
+        return settings.DOWNLOAD_SIZE_FALLBACK
+
+    if mode == "video" and fmt.get("acodec") in (None, "none"):
+        audio = _best_audio(formats)
+        size += (estimate_format_size(audio, duration) or 0) if audio else 0
+        size *= 2
+
+    if clip is not None and duration:
+        size = int(size * min(clip.duration / duration, 1.0))
+
+    # Marge : les tailles annoncées (surtout approx / tbr) sont souvent sous-estimées.
+    return int(size * settings.DOWNLOAD_SIZE_MARGIN)
+
+
+# --------------------------------------------------------------------------------------
+# Réservations d'espace disque (partagées par tous les workers de la machine)
+# --------------------------------------------------------------------------------------
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Reservation:
+    def __init__(self, manager: "StorageManager", id: str, size: int):
+        self.manager = manager
+        self.id = id
+        self.size = size
+        self._released = False
+
+    def resize(self, size: int) -> None:
+        """
+        Ajuste la réservation une fois le fichier final produit : sa taille réelle s'il reste
+        dans le dossier du job jusqu'à la fin de l'envoi, 0 s'il a quitté ce dossier.
+        """
+        if not self._released:
+            self.size = size
+            self.manager._resize(self.id, size)
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self.manager._release(self.id)
+
+
+class StorageManager:
+    """
+    Admission des téléchargements selon l'espace disque du dossier temporaire.
+
+    Chaque job réserve sa taille estimée avant de démarrer et la libère quand il est
+    terminé (fichier envoyé ou erreur). Si la réservation ne tient pas, le job attend
+    (au plus DOWNLOAD_QUEUE_TIMEOUT s, DOWNLOAD_QUEUE_MAX jobs en attente) puis est refusé.
+
+    Les réservations sont stockées dans un fichier SQLite local (DOWNLOAD_RESERVATIONS_DB) :
+    tous les workers gunicorn de la machine partagent le même disque, donc le même compteur.
+    Les réservations d'un worker mort (OOM, kill) sont purgées à la réservation suivante.
+
+    - DOWNLOAD_DISK_BUDGET défini : somme des réservations + job <= budget
+    - sinon : reste à écrire des jobs en cours + job <= espace libre - DOWNLOAD_DISK_MARGIN
+      (l'espace libre reflète déjà ce que les jobs en cours ont écrit dans leur dossier)
+    """
+
+    POLL_INTERVAL = 0.5
+
+    def __init__(self, path: str | None = None, db_path: str | None = None):
+        self.path = path or tempfile.gettempdir()
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Une connexion par thread et par processus (jamais partagée après un fork).
+        path = self.db_path or settings.DOWNLOAD_RESERVATIONS_DB
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid() or self._local.path != path:
+            conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+            # Schéma vérifié à chaque connexion : DOWNLOAD_RESERVATIONS_DB peut changer
+            # (benchmarks, tests) et le fichier être recréé après un nettoyage de /tmp.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS reservation (
+                    id TEXT PRIMARY KEY, pid INTEGER NOT NULL, size INTEGER NOT NULL,
+                    path TEXT, waiting INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._local.conn, self._local.pid, self._local.path = conn, os.getpid(), path
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _purge_dead(self, conn: sqlite3.Connection) -> None:
+        pids = {pid for (pid,) in conn.execute("SELECT DISTINCT pid FROM reservation")}
+        for pid in pids:
+            if not _pid_alive(pid):
+                conn.execute("DELETE FROM reservation WHERE pid = ?", (pid,))
+
+    def _active(self, conn: sqlite3.Connection) -> list[tuple[int, str | None]]:
+        return conn.execute("SELECT size, path FROM reservation WHERE waiting = 0").fetchall()
+
+    def budget(self) -> int:
+        """Espace encore disponible pour un nouveau job (octets)."""
+        return self._budget(self._conn())
+
+    def _budget(self, conn: sqlite3.Connection) -> int:
+        active = self._active(conn)
+        if settings.DOWNLOAD_DISK_BUDGET:
+            return settings.DOWNLOAD_DISK_BUDGET - sum(size for size, _ in active)
+        # Seul le reste à écrire de chaque job compte : ses octets déjà écrits sont
+        # déjà absents de l'espace libre.
+        pending = sum(max(size - (_dir_size(path) if path else 0), 0) for size, path in active)
+        free = shutil.disk_usage(self.path).free
+        return free - settings.DOWNLOAD_DISK_MARGIN - pending
+
+    def capacity(self) -> int:
+        """Espace total utilisable par les téléchargements, jobs en cours compris."""
+        if settings.DOWNLOAD_DISK_BUDGET:
+            return settings.DOWNLOAD_DISK_BUDGET
+        written = sum(_dir_size(path) for _, path in self._active(self._conn()) if path)
+        return shutil.disk_usage(self.path).free + written - settings.DOWNLOAD_DISK_MARGIN
+
+    def waiting(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM reservation WHERE waiting = 1").fetchone()[0]
+
+    def reserve(self, size: int, path: str | None = None) -> Reservation:
+        """
+        Réserve `size` octets pour un job qui écrit dans le dossier `path`.
+        Lève InsufficientStorage si le job ne peut pas être admis.
+        """
+        if size > self.capacity():
+            raise InsufficientStorage("Fichier trop volumineux pour l'espace disque du serveur.")
+
+        id = uuid.uuid4().hex
+        with self._transaction() as conn:
+            self._purge_dead(conn)
+            if size <= self._budget(conn):
+                conn.execute(
+                    "INSERT INTO reservation (id, pid, size, path) VALUES (?, ?, ?, ?)",
+                    (id, os.getpid(), size, path),
+                )
+                return Reservation(self, id, size)
+            waiting = conn.execute("SELECT COUNT(*) FROM reservation WHERE waiting = 1").fetchone()[0]
+            if waiting >= settings.DOWNLOAD_QUEUE_MAX:
+                raise InsufficientStorage("Serveur saturé, réessaie dans quelques minutes.")
+            conn.execute(
+                "INSERT INTO reservation (id, pid, size, path, waiting) VALUES (?, ?, ?, ?, 1)",
+                (id, os.getpid(), size, path),
+            )
+        self._update_gauge()
+
+        deadline = time.monotonic() + settings.DOWNLOAD_QUEUE_TIMEOUT
+        try:
+            while True:
+                time.sleep(min(self.POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+                with self._transaction() as conn:
+                    self._purge_dead(conn)
+                    if size <= self._budget(conn):
+                        conn.execute("UPDATE reservation SET waiting = 0 WHERE id = ?", (id,))
+                        return Reservation(self, id, size)
+                if time.monotonic() >= deadline:
+                    raise InsufficientStorage("Serveur saturé, réessaie dans quelques minutes.")
+        except BaseException:
+            self._conn().execute("DELETE FROM reservation WHERE id = ? AND waiting = 1", (id,))
+            raise
+        finally:
+            self._update_gauge()
+
+    def _resize(self, id: str, size: int) -> None:
+        self._conn().execute("UPDATE reservation SET size = ? WHERE id = ?", (size, id))
+
+    def _release(self, id: str) -> None:
+        self._conn().execute("DELETE FROM reservation WHERE id = ?", (id,))
+
+    def _update_gauge(self) -> None:
+        QUEUE_DEPTH.labels("download_admission").set(self.waiting())
+
+
+storage_manager = StorageManager()
+
+
+class ReleasingFile(io.FileIO):
+    """
+    Fichier dont la fermeture (fin de l'envoi par FileResponse) déclenche `on_close`.
+    """
+
+    def __init__(self, path: str, on_close: Callable[[], None]):
+        self._on_close = on_close
+        super().__init__(path, "rb")
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close:
+                on_close()
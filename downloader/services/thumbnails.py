@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .metrics import record_cache
+
+
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+# Largeurs servies (srcset de search.html). 320 = miniature "medium" de l'API YouTube.
+THUMBNAIL_WIDTHS = (160, 320)
+SOURCE_URL = "https://i.ytimg.com/vi/{video_id}/mqdefault.jpg"
+
+
+def source_url(video_id: str) -> str:
+    return SOURCE_URL.format(video_id=video_id)
+
+
+def _pil_image():
+    """
+    Module PIL.Image importé à la demande, ou None si Pillow est absent
+    (on sert alors la miniature d'origine en JPEG).
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def _cache_dir() -> Path:
+    path = Path(settings.THUMBNAIL_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _fetch_original(video_id: str) -> Path:
+    """
+    Télécharge (une seule fois) la miniature d'origine depuis le CDN YouTube.
+    """
+    import requests
+
+    path = _cache_dir() / f"{video_id}.jpg"
+    if not path.exists():
+        response = requests.get(source_url(video_id), timeout=10)
+        response.raise_for_status()
+        _atomic_write(path, response.content)
+    return path
+
+
+def _make_variant(Image, original: Path, target: Path, width: int) -> None:
+    with Image.open(original) as img:
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix=".tmp_", suffix=".webp")
+        os.close(fd)
+        try:
+            img.convert("RGB").save(tmp, "WEBP", quality=settings.THUMBNAIL_WEBP_QUALITY, method=4)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+
+def _touch(path: Path) -> None:
+    # LRU : la miniature redevient la plus récente (voir _evict).
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+
+def _evict(root: Path, max_bytes: int, keep: tuple[Path, ...]) -> int:
+    """
+    Supprime les miniatures les moins récemment servies jusqu'à repasser sous `max_bytes`
+    et retourne la taille restante du cache.
+    Un autre worker peut évincer en même temps : les fichiers disparus sont ignorés.
+    """
+    entries = []
+    total = 0
+    for path in root.iterdir():
+        if path.name.startswith(".tmp_"):
+            continue
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        total += st.st_size
+        if path not in keep:
+            entries.append((st.st_mtime, st.st_size, path))
+
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        path.unlink(missing_ok=True)
+        total -= size
+    return total
+
+
+class _CacheSize:
+    """
+    Taille du cache estimée par le processus : le dossier n'est parcouru (stat de chaque
+    fichier) que si l'estimation dépasse le plafond, ou au plus tard toutes les
+    SCAN_INTERVAL s pour tenir compte de ce qu'écrivent les autres workers.
+    """
+
+    SCAN_INTERVAL = 60
+
+    def __init__(self):
+        self.total: int | None = None
+        self.scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def added(self, root: Path, written: int, keep: tuple[Path, ...]) -> None:
+        max_bytes = settings.THUMBNAIL_CACHE_MAX_BYTES
+        with self._lock:
+            if self.total is not None:
+                self.total += written
+                fresh = time.monotonic() - self.scanned_at < self.SCAN_INTERVAL
+                if fresh and self.total <= max_bytes:
+                    return
+            self.total = _evict(root, max_bytes, keep)
+            self.scanned_at = time.monotonic()
+
+
+_cache_size = _CacheSize()
+
+
+def get_thumbnail(video_id: str, width: int) -> tuple[Path, str]:
+    """
+    Retourne (chemin local, content-type) de la miniature `video_id` à la largeur demandée :
+    WebP redimensionné si Pillow est disponible, sinon le JPEG d'origine.
+    Lève ValueError si les paramètres sont invalides, requests.RequestException si le CDN échoue.
+    """
+    if not VIDEO_ID_RE.match(video_id) or width not in THUMBNAIL_WIDTHS:
+        raise ValueError("Miniature invalide")
+
+    Image = _pil_image()
+    if Image is None:
+        path, content_type = _cache_dir() / f"{video_id}.jpg", "image/jpeg"
+    else:
+        path, content_type = _cache_dir() / f"{video_id}_{width}.webp", "image/webp"
+
+    hit = path.exists()
+    record_cache("thumbnail", hit)
+    if hit:
+        _touch(path)
+        return path, content_type
+
+    fetched = not (path.parent / f"{video_id}.jpg").exists()
+    original = _fetch_original(video_id)
+    written = original.stat().st_size if fetched else 0
+    if Image is not None:
+        _make_variant(Image, original, path, width)
+        written += path.stat().st_size
+    # Le cache partage le disque éphémère des téléchargements : taille bornée.
+    _cache_size.added(path.parent, written, keep=(original, path))
+    return path, content_type
+
+
+def etag_for(path: Path) -> str:
+    # Pas de mtime : il change à chaque accès (LRU), le contenu lui est immuable.
+    return f'"{path.name}-{path.stat().st_size:x}"'
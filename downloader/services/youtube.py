@@ -1,6 +1,9 @@
-import requests
+import time
+
 from django.conf import settings
 
+from .metrics import YOUTUBE_API_SECONDS
+
 
 YOUTUBE_SEARCH_URL = "https://www.googleapis.com/youtube/v3/search"
 
@@ -10,6 +13,8 @@ def search_youtube_videos(query: str, page_token: str | None = None, max_results
     Appelle YouTube Data API v3 (search.list) pour récupérer une liste de vidéos.
     Retourne: items + next/prev page token.
     """
+    import requests
+
     if not settings.YOUTUBE_API_KEY:
         raise RuntimeError("YOUTUBE_API_KEY manquante. Ajoute-la dans ton .env puis relance le serveur.")
 
@@ -24,9 +29,15 @@ def search_youtube_videos(query: str, page_token: str | None = None, max_results
     if page_token:
         params["pageToken"] = page_token
 
-    response = requests.get(YOUTUBE_SEARCH_URL, params=params, timeout=15)
-    response.raise_for_status()
-    data = response.json()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        response = requests.get(YOUTUBE_SEARCH_URL, params=params, timeout=15)
+        response.raise_for_status()
+        data = response.json()
+        outcome = "ok"
+    finally:
+        YOUTUBE_API_SECONDS.labels("search", outcome).observe(time.perf_counter() - start)
 
     results = []
     for item in data.get("items", []):
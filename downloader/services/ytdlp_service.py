@@ -1,10 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import hashlib
+import time
+from dataclasses import dataclass, field
 from typing import Any
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, urlparse
 
-from yt_dlp import YoutubeDL
+from django.conf import settings
+
+from .coordination import LockTimeout, get_backend
+from .metrics import EXTRACT_SECONDS, record_cache
 
 
 YOUTUBE_HOSTS = {"www.youtube.com", "youtube.com", "m.youtube.com", "youtu.be"}
@@ -16,6 +21,16 @@ def is_allowed_youtube_url(url: str) -> bool:
     return host in YOUTUBE_HOSTS
 
 
+def video_id_from_url(url: str) -> str | None:
+    parsed = urlparse(url)
+    host = (parsed.netloc or "").lower()
+    if host == "youtu.be":
+        return parsed.path.strip("/").split("/")[0] or None
+    if parsed.path.startswith(("/shorts/", "/embed/", "/live/")):
+        return parsed.path.split("/")[2] or None
+    return (parse_qs(parsed.query).get("v") or [None])[0]
+
+
 @dataclass
 class FormatChoice:
     format_id: str
@@ -27,15 +42,94 @@ def extract_video_info(url: str) -> dict[str, Any]:
     """
     Récupère les métadonnées + la liste de formats sans télécharger.
     """
+    # Import à la demande : yt-dlp (et ses centaines d'extracteurs) coûte ~0,2s au démarrage
+    # d'un worker. Préchargé dans le master gunicorn (voir gunicorn.conf.py).
+    from yt_dlp import YoutubeDL
+
     ydl_opts = {
         "quiet": True,
         "noplaylist": True,
         "skip_download": True,
     }
 
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+        outcome = "ok"
         return info
+    finally:
+        EXTRACT_SECONDS.labels(outcome).observe(time.perf_counter() - start)
+
+
+# --------------------------------------------------------------------------------------
+# Cache des métadonnées (backend de coordination partagé, alimenté aussi par prefetch.py)
+# --------------------------------------------------------------------------------------
+# Champs volumineux inutiles pour nos pages (sous-titres auto = plusieurs centaines de Ko).
+_UNCACHED_KEYS = ("automatic_captions", "subtitles", "heatmap")
+
+
+def video_info_cache_key(url: str) -> str:
+    video_id = video_id_from_url(url) or hashlib.sha1(url.encode()).hexdigest()
+    return f"ytdlp:info:{video_id}"
+
+
+def is_video_info_cached(url: str) -> bool:
+    return get_backend().get(video_info_cache_key(url)) is not None
+
+
+def _extract_and_cache(url: str, key: str) -> dict[str, Any]:
+    info = extract_video_info(url)
+    info = {k: v for k, v in info.items() if k not in _UNCACHED_KEYS}
+    get_backend().set_object(key, info, settings.VIDEO_INFO_CACHE_TTL)
+    return info
+
+
+def get_video_info(url: str) -> dict[str, Any]:
+    """
+    Comme extract_video_info, mais :
+    - sert les métadonnées depuis le cache partagé (VIDEO_INFO_CACHE_TTL)
+    - une seule extraction à la fois par vidéo, tous workers / machines confondus :
+      si une extraction est déjà en cours (ex: préchargement), on attend son résultat.
+    """
+    backend = get_backend()
+    key = video_info_cache_key(url)
+    info = backend.get_object(key)
+    record_cache("video_info", info is not None)
+    if info is not None:
+        return info
+
+    try:
+        with backend.lock(key, ttl=settings.VIDEO_INFO_LOCK_TTL, timeout=settings.VIDEO_INFO_WAIT_TIMEOUT):
+            # Extraite par quelqu'un d'autre pendant qu'on attendait le verrou ?
+            info = backend.get_object(key)
+            return info if info is not None else _extract_and_cache(url, key)
+    except LockTimeout:
+        # Extraction concurrente trop lente (ou détenteur disparu) : on extrait nous-mêmes.
+        return _extract_and_cache(url, key)
+
+
+@dataclass
+class PostprocessorTimer:
+    """
+    Hook `postprocessor_hooks` de yt-dlp : mesure la durée de chaque post-processeur
+    (ex: "Merger" pour la fusion FFmpeg audio + vidéo).
+    """
+    durations: dict[str, float] = field(default_factory=dict)
+    _started: dict[str, float] = field(default_factory=dict)
+
+    def hook(self, d: dict[str, Any]) -> None:
+        name = d.get("postprocessor") or ""
+        if d.get("status") == "started":
+            self._started[name] = time.perf_counter()
+        elif d.get("status") == "finished" and name in self._started:
+            elapsed = time.perf_counter() - self._started.pop(name)
+            self.durations[name] = self.durations.get(name, 0.0) + elapsed
+
+    @property
+    def total(self) -> float:
+        return sum(self.durations.values())
 
 
 def build_audio_choices(info: dict[str, Any]) -> list[FormatChoice]:
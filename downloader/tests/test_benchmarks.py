@@ -0,0 +1,37 @@
+import os
+import signal
+import time
+
+from django.test import SimpleTestCase
+
+from downloader.benchmarks.runner import Scenario, run_scenario_isolated
+
+
+def _killed(stack, server):
+    os.kill(os.getpid(), signal.SIGKILL)  # OOM killer simulé
+
+
+def _hangs(stack, server):
+    time.sleep(60)
+
+
+def _ok(stack, server):
+    return lambda: 0
+
+
+class RunScenarioIsolatedTests(SimpleTestCase):
+    def test_result(self):
+        result = run_scenario_isolated(Scenario("ok", 3, _ok, warmup=0), rate=0)
+        self.assertNotIn("error", result)
+        self.assertEqual(result["name"], "ok")
+
+    def test_child_killed_without_result(self):
+        result = run_scenario_isolated(Scenario("killed", 1, _killed), rate=0, timeout=30)
+        self.assertEqual(result["name"], "killed")
+        self.assertIn("exitcode -9", result["error"])
+
+    def test_child_that_hangs_is_killed(self):
+        started = time.monotonic()
+        result = run_scenario_isolated(Scenario("hangs", 1, _hangs), rate=0, timeout=1)
+        self.assertIn("délai dépassé", result["error"])
+        self.assertLess(time.monotonic() - started, 10)
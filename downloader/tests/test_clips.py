@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from downloader.services import clips
+from downloader.services.clips import ClipPlan, parse_timestamp, plan_clip
+
+
+class ParseTimestampTests(SimpleTestCase):
+    def test_formats(self):
+        self.assertIsNone(parse_timestamp(""))
+        self.assertIsNone(parse_timestamp("  "))
+        self.assertEqual(parse_timestamp("90"), 90)
+        self.assertEqual(parse_timestamp("1:30"), 90)
+        self.assertEqual(parse_timestamp("01:02:03"), 3723)
+        self.assertEqual(parse_timestamp("12.5"), 12.5)
+        self.assertEqual(parse_timestamp("0:12,5"), 12.5)
+        self.assertEqual(parse_timestamp("75:00"), 4500)
+
+    def test_rejects_out_of_range_fields(self):
+        for value in ("1:75", "1:60", "1:75:00", "1:00:60"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_timestamp(value)
+
+    def test_rejects_garbage(self):
+        for value in ("abc", "1:2:3:4", "-5", "1::2"):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_timestamp(value)
+
+
+@override_settings(CLIP_MIN_COPY_SECONDS=10)
+class PlanClipTests(SimpleTestCase):
+    info = {"duration": 300}
+
+    def test_no_clip_requested(self):
+        self.assertIsNone(plan_clip(self.info, "", ""))
+
+    def test_full_video_is_not_a_clip(self):
+        self.assertIsNone(plan_clip(self.info, "0", "5:00"))
+        self.assertIsNone(plan_clip(self.info, "", "10:00"))
+
+    def test_end_is_clamped_to_duration(self):
+        self.assertEqual(plan_clip(self.info, "1:00", "9:00"), ClipPlan(60, 300, False))
+
+    def test_missing_start_or_end(self):
+        self.assertEqual(plan_clip(self.info, "", "1:00"), ClipPlan(0, 60, False))
+        self.assertEqual(plan_clip(self.info, "4:00", ""), ClipPlan(240, 300, False))
+
+    def test_short_clips_are_cut_precisely(self):
+        self.assertTrue(plan_clip(self.info, "1:00", "1:05").precise)
+        self.assertTrue(plan_clip(self.info, "1:00", "2:00", precise=True).precise)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            plan_clip(self.info, "2:00", "1:00")
+        with self.assertRaises(ValueError):
+            plan_clip(self.info, "1:00", "1:00")
+        with self.assertRaises(ValueError):
+            plan_clip({"duration": None}, "1:00", "")
+        with self.assertRaises(ValueError):
+            plan_clip(self.info, "1:75", "")
+
+
+class ClipCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        override = override_settings(CLIP_CACHE_DIR=str(self.root / "cache"), CLIP_CACHE_MAX_BYTES=10)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _produce(self, name: str, size: int) -> str:
+        path = self.root / name
+        path.write_bytes(b"x" * size)
+        return str(path)
+
+    def test_store_evicts_older_entries_but_keeps_new_one(self):
+        clips.store_clip("old", self._produce("old.mp4", 8))
+        stored = clips.store_clip("new", self._produce("new.mp4", 8))
+        self.assertEqual(stored.read_bytes(), b"x" * 8)
+        self.assertIsNone(clips.get_cached_clip("old"))
+        self.assertEqual(clips.get_cached_clip("new"), stored)
+
+    def test_eviction_ignores_entries_removed_concurrently(self):
+        clips.store_clip("old", self._produce("old.mp4", 8))
+        real_size = clips._entry_size
+
+        def vanishing(entry):
+            # Un autre worker supprime l'entrée pendant qu'on la mesure.
+            if entry.name == "old":
+                shutil.rmtree(entry)
+            return real_size(entry)
+
+        with mock.patch.object(clips, "_entry_size", side_effect=vanishing):
+            stored = clips.store_clip("new", self._produce("new.mp4", 8))
+        self.assertTrue(os.path.exists(stored))
+        self.assertIsNone(clips.get_cached_clip("old"))
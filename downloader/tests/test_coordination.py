@@ -0,0 +1,159 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from downloader.benchmarks.fake_redis import FakeRedisServer
+from downloader.services.coordination import LockTimeout, LocMemBackend, SQLiteBackend, backend_from_url
+
+
+class BackendContract:
+    """
+    Comportement attendu de tout backend de coordination.
+    Chaque sous-classe fournit `make_backend()`.
+    """
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        self.backend = self.make_backend()
+
+    def test_get_set_delete(self):
+        self.assertIsNone(self.backend.get("k"))
+        self.backend.set("k", b"v")
+        self.assertEqual(self.backend.get("k"), b"v")
+        self.backend.set("k", b"w")
+        self.assertEqual(self.backend.get("k"), b"w")
+        self.backend.delete("k")
+        self.assertIsNone(self.backend.get("k"))
+
+    def test_objects(self):
+        self.backend.set_object("info", {"id": "abc", "formats": [1, 2]})
+        self.assertEqual(self.backend.get_object("info"), {"id": "abc", "formats": [1, 2]})
+        self.assertIsNone(self.backend.get_object("missing"))
+
+    def test_ttl_expiry(self):
+        self.backend.set("k", b"v", ttl=0.1)
+        self.backend.set("forever", b"v")
+        self.assertEqual(self.backend.get("k"), b"v")
+        time.sleep(0.2)
+        self.assertIsNone(self.backend.get("k"))
+        self.assertEqual(self.backend.get("forever"), b"v")
+
+    def test_add_only_sets_missing_keys(self):
+        self.assertTrue(self.backend.add("k", b"first"))
+        self.assertFalse(self.backend.add("k", b"second"))
+        self.assertEqual(self.backend.get("k"), b"first")
+
+    def test_add_replaces_expired_key(self):
+        self.assertTrue(self.backend.add("k", b"first", ttl=0.1))
+        time.sleep(0.2)
+        self.assertTrue(self.backend.add("k", b"second"))
+        self.assertEqual(self.backend.get("k"), b"second")
+
+    def test_delete_if_equals(self):
+        self.backend.set("k", b"mine")
+        self.assertFalse(self.backend.delete_if_equals("k", b"other"))
+        self.assertEqual(self.backend.get("k"), b"mine")
+        self.assertTrue(self.backend.delete_if_equals("k", b"mine"))
+        self.assertIsNone(self.backend.get("k"))
+        self.assertFalse(self.backend.delete_if_equals("k", b"mine"))
+
+    def test_pop_follows_priority_then_fifo(self):
+        self.backend.push("low", b"l1")
+        self.backend.push("high", b"h1")
+        self.backend.push("high", b"h2")
+        self.backend.push("low", b"l2")
+        self.assertEqual(self.backend.qsize("high"), 2)
+        popped = [self.backend.pop(["high", "low"], 0.5) for _ in range(4)]
+        self.assertEqual(popped, [("high", b"h1"), ("high", b"h2"), ("low", b"l1"), ("low", b"l2")])
+        self.assertEqual(self.backend.qsize("high"), 0)
+
+    def test_pop_times_out_on_empty_queues(self):
+        started = time.monotonic()
+        self.assertIsNone(self.backend.pop(["empty"], 0.2))
+        self.assertGreaterEqual(time.monotonic() - started, 0.15)
+
+    def test_pop_wakes_up_on_push(self):
+        timer = threading.Timer(0.1, self.backend.push, ("q", b"late"))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        self.assertEqual(self.backend.pop(["q"], 5), ("q", b"late"))
+
+    def test_lock_is_exclusive_and_times_out(self):
+        with self.backend.lock("video", ttl=10):
+            started = time.monotonic()
+            with self.assertRaises(LockTimeout):
+                with self.backend.lock("video", ttl=10, timeout=0.2):
+                    pass
+            self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        # Relâché à la sortie du bloc.
+        with self.backend.lock("video", ttl=10):
+            pass
+
+    def test_lock_expires_if_holder_disappears(self):
+        self.assertTrue(self.backend.add("lock:video", b"dead-worker", ttl=0.1))
+        with self.backend.lock("video", ttl=10, timeout=2):
+            pass
+
+    def test_lock_does_not_release_someone_elses_lock(self):
+        with self.backend.lock("video", ttl=0.1):
+            time.sleep(0.2)
+            # Le verrou a expiré et un autre worker l'a pris.
+            self.assertTrue(self.backend.add("lock:video", b"other", ttl=10))
+        self.assertEqual(self.backend.get("lock:video"), b"other")
+
+
+class LocMemBackendTests(BackendContract, SimpleTestCase):
+    def make_backend(self):
+        return LocMemBackend()
+
+
+class SQLiteBackendTests(BackendContract, SimpleTestCase):
+    def make_backend(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return backend_from_url(f"sqlite:///{os.path.join(tmp.name, 'coord.db')}")
+
+    def test_expired_keys_are_purged_on_write(self):
+        self.backend.PURGE_INTERVAL = 0
+        self.backend.set("old", b"x" * 1024, ttl=0.05)
+        time.sleep(0.1)
+        self.backend.set("new", b"v")
+        rows = self.backend._conn().execute("SELECT key FROM kv").fetchall()
+        self.assertEqual(rows, [("new",)])
+
+    def test_shared_between_instances(self):
+        other = SQLiteBackend(self.backend.path)
+        self.backend.push("q", b"job")
+        self.assertEqual(other.pop(["q"], 0.5), ("q", b"job"))
+
+
+class RedisBackendTests(BackendContract, SimpleTestCase):
+    def make_backend(self):
+        self.server = FakeRedisServer().__enter__()
+        self.addCleanup(self.server.__exit__, None, None, None)
+        return backend_from_url(self.server.url)
+
+    def test_lost_push_reply_is_not_retried(self):
+        self.server.drop_replies.add("LPUSH")
+        with self.assertRaises(ConnectionError):
+            self.backend.push("q", b"job")
+        self.assertEqual(self.backend.qsize("q"), 1)
+
+    def test_lost_get_reply_is_retried(self):
+        self.backend.set("k", b"v")
+        self.server.drop_replies.add("GET")
+        self.assertEqual(self.backend.get("k"), b"v")
+
+    def test_reconnects_after_server_closed_connection(self):
+        self.backend.set("k", b"v")
+        self.server.close_connections()
+        time.sleep(0.05)
+        self.backend.push("q", b"job")
+        self.assertEqual(self.backend.qsize("q"), 1)
+        self.assertEqual(self.backend.get("k"), b"v")
@@ -0,0 +1,95 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from downloader.services import metrics
+
+
+class RegistryTests(SimpleTestCase):
+    def make_registry(self):
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter("t_total", "doc", ("mode",)))
+        gauge = registry.register(metrics.Gauge("t_depth", "doc", ("queue",)))
+        histogram = registry.register(metrics.Histogram("t_seconds", "doc", buckets=(1, 10)))
+        return registry, counter, gauge, histogram
+
+    def test_render(self):
+        registry, counter, gauge, histogram = self.make_registry()
+        counter.labels("audio").inc(3)
+        gauge.labels("prefetch").set(2)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        text = registry.render()
+        self.assertIn('t_total{mode="audio"} 3', text)
+        self.assertIn('t_depth{queue="prefetch"} 2', text)
+        self.assertIn('t_seconds_bucket{le="1"} 1', text)
+        self.assertIn('t_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn("t_seconds_count 2", text)
+
+    def test_merge_sums_counters_and_keeps_latest_gauge(self):
+        registry, counter, gauge, histogram = self.make_registry()
+        counter.labels("audio").inc(2)
+        gauge.labels("q").set(5)
+        histogram.observe(0.5)
+        first = registry.snapshot()
+        counter.labels("audio").inc(1)
+        gauge.labels("q").set(1)
+        histogram.observe(50)
+        second = registry.snapshot()
+
+        text = registry.render(registry.merge([first, second]))
+        self.assertIn('t_total{mode="audio"} 5', text)
+        self.assertIn('t_depth{queue="q"} 1', text)
+        self.assertIn("t_seconds_count 3", text)
+
+
+WORKER = """
+import os, sys, time
+os.environ["DJANGO_SETTINGS_MODULE"] = "config.settings"
+os.environ["METRICS_MULTIPROC_DIR"] = sys.argv[1]
+from downloader.services import metrics
+metrics.BYTES_SERVED.labels("audio").inc(100)
+metrics.EXPORTER.flush()
+"""
+
+
+class MultiprocessTests(SimpleTestCase):
+    def test_values_of_all_workers_are_aggregated(self):
+        # Ce processus (la suite de tests) a peut-être déjà servi des octets.
+        own = metrics.BYTES_SERVED.labels("audio").value
+        expected = f'appolon_bytes_served_total{{mode="audio"}} {metrics._format_value(own + 200)}'
+        with tempfile.TemporaryDirectory() as directory:
+            # Deux workers terminés : leurs compteurs restent comptés (archive.json).
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", WORKER, directory], check=True, cwd=os.getcwd())
+            with override_settings(METRICS_MULTIPROC_DIR=directory):
+                text = metrics.render_latest()
+                again = metrics.render_latest()
+            files = sorted(n for n in os.listdir(directory) if n.endswith(".json"))
+
+        self.assertIn(expected, text)
+        self.assertIn(expected, again)
+        self.assertEqual(len(files), 2)  # archive.json + ce processus
+        self.assertIn("archive.json", files)
+
+
+class MetricsViewTests(SimpleTestCase):
+    @override_settings(DEBUG=False, METRICS_TOKEN="", METRICS_MULTIPROC_DIR="")
+    def test_requires_token_outside_debug(self):
+        self.assertEqual(self.client.get(reverse("downloader:metrics")).status_code, 403)
+
+    @override_settings(DEBUG=False, METRICS_TOKEN="s3cret", METRICS_MULTIPROC_DIR="")
+    def test_bearer_token(self):
+        url = reverse("downloader:metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"appolon_bytes_served_total", response.content)
+
+    @override_settings(DEBUG=True, METRICS_TOKEN="", METRICS_MULTIPROC_DIR="")
+    def test_open_in_debug(self):
+        self.assertEqual(self.client.get(reverse("downloader:metrics")).status_code, 200)
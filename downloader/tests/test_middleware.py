@@ -0,0 +1,31 @@
+import tempfile
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from downloader.middleware import ProfilingMiddleware
+from downloader.services import profiling
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_MODE="cprofile")
+class ProfilingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        override = override_settings(PROFILING_DIR=tmp.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.middleware = ProfilingMiddleware(lambda request: HttpResponse("ok"))
+
+    def test_profile_is_saved(self):
+        response = self.middleware(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(profiling.list_profiles()), 1)
+
+    def test_save_failure_does_not_break_the_response(self):
+        with mock.patch.object(profiling, "save_profile", side_effect=OSError("disque plein")):
+            with self.assertLogs("downloader.middleware", "ERROR"):
+                response = self.middleware(RequestFactory().get("/"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b"ok")
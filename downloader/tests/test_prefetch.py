@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from downloader.services import prefetch
+
+
+BATCH = "0123456789abcdef0123456789abcdef"
+
+SEARCH_PAYLOAD = {
+    "items": [
+        {"video_id": "aaaaaaaaaaa", "title": "A", "channel_title": "", "published_at": "", "thumbnail_url": ""},
+    ],
+    "next_page_token": "NEXT",
+    "prev_page_token": None,
+}
+
+
+@mock.patch("downloader.views.search_youtube_videos", return_value=SEARCH_PAYLOAD)
+@mock.patch("downloader.views.prefetch_search_results", return_value=BATCH)
+@mock.patch("downloader.views.cancel_prefetch")
+class PrefetchViewsTests(TestCase):
+    def test_search_does_not_touch_the_session(self, cancel, submit, search):
+        response = self.client.get(reverse("downloader:search"), {"q": "chat"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("sessionid", response.cookies)
+        self.assertContains(response, f"batch={BATCH}")
+        self.assertContains(response, f'name="batch" value="{BATCH}"')
+        self.assertNotContains(response, "select/aaaaaaaaaaa/?batch")
+
+    def test_new_search_cancels_previous_batch(self, cancel, submit, search):
+        self.client.get(reverse("downloader:search"), {"q": "chien", "batch": "old"})
+        cancel.assert_called_once_with("old")
+
+    def test_home_cancels_batch(self, cancel, submit, search):
+        self.client.get(reverse("downloader:home"), {"batch": BATCH})
+        cancel.assert_called_once_with(BATCH)
+
+    def test_selecting_a_result_keeps_prefetching(self, cancel, submit, search):
+        response = self.client.get(reverse("downloader:select_video", args=["aaaaaaaaaaa"]))
+        self.assertEqual(response.status_code, 302)
+        cancel.assert_not_called()
+
+
+class CancelPrefetchTests(TestCase):
+    @override_settings(PREFETCH_ENABLED=True)
+    def test_only_batch_ids_are_accepted(self):
+        with mock.patch.object(prefetch._prefetcher, "cancel") as cancel:
+            prefetch.cancel_prefetch(None)
+            prefetch.cancel_prefetch("../../etc")
+            prefetch.cancel_prefetch(BATCH)
+        cancel.assert_called_once_with(BATCH)
@@ -0,0 +1,243 @@
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from downloader.services import storage
+from downloader.services.clips import ClipPlan
+from downloader.services.storage import InsufficientStorage, StorageManager, estimate_output_size
+
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+@override_settings(
+    DOWNLOAD_DISK_BUDGET=0, DOWNLOAD_DISK_MARGIN=0,
+    DOWNLOAD_QUEUE_TIMEOUT=0.3, DOWNLOAD_QUEUE_MAX=8,
+)
+class StorageManagerTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.db = os.path.join(tmp.name, "reservations.sqlite3")
+        self.free = 1000
+        patcher = mock.patch.object(storage.shutil, "disk_usage", side_effect=lambda _: DiskUsage(0, 0, self.free))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _manager(self) -> StorageManager:
+        manager = StorageManager(db_path=self.db)
+        manager.POLL_INTERVAL = 0.02
+        return manager
+
+    def test_in_flight_reservations_count_against_free_space(self):
+        manager = self._manager()
+        manager.reserve(600)
+        with self.assertRaises(InsufficientStorage):
+            manager.reserve(600)
+        manager.reserve(400)
+
+    def test_reservations_are_shared_between_workers(self):
+        # Deux StorageManager sur le même fichier = deux workers gunicorn de la machine.
+        first, second = self._manager(), self._manager()
+        reservation = first.reserve(600)
+        with self.assertRaises(InsufficientStorage):
+            second.reserve(600)
+        reservation.release()
+        second.reserve(600)
+
+    def test_bytes_already_written_are_not_counted_twice(self):
+        manager = self._manager()
+        job = os.path.join(self.dir, "job")
+        os.mkdir(job)
+        manager.reserve(600, path=job)
+        with open(os.path.join(job, "video.part"), "wb") as fh:
+            fh.write(b"x" * 500)
+        self.free = 500  # le disque reflète les 500 octets écrits
+        manager.reserve(400)
+
+    def test_streaming_phase_is_not_counted_twice(self):
+        manager = self._manager()
+        job = os.path.join(self.dir, "job")
+        os.mkdir(job)
+        reservation = manager.reserve(900, path=job)  # estimation (marge, fusion...)
+        with open(os.path.join(job, "video.mp4"), "wb") as fh:
+            fh.write(b"x" * 300)
+        self.free = 700
+        reservation.resize(300)  # fichier final, envoyé depuis le dossier du job
+        self.assertEqual(manager.budget(), 700)
+
+    def test_clip_moved_out_of_the_job_directory(self):
+        manager = self._manager()
+        job = os.path.join(self.dir, "job")
+        os.mkdir(job)
+        reservation = manager.reserve(900, path=job)
+        self.free = 700  # 300 octets partis dans le cache des clips
+        reservation.resize(0)
+        self.assertEqual(manager.budget(), 700)
+
+    def test_job_that_does_not_fit_queues_then_is_refused(self):
+        manager = self._manager()
+        manager.reserve(800)
+        errors, waiting = [], []
+
+        def second_job():
+            try:
+                manager.reserve(500)
+            except InsufficientStorage as exc:
+                errors.append(exc)
+
+        thread = threading.Thread(target=second_job)
+        started = time.monotonic()
+        thread.start()
+        time.sleep(0.1)
+        waiting.append(manager.waiting())
+        thread.join(5)
+
+        self.assertEqual(waiting, [1])
+        self.assertEqual(len(errors), 1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.3)
+        self.assertEqual(manager.waiting(), 0)
+
+    def test_waiting_job_is_admitted_when_space_is_released(self):
+        manager = self._manager()
+        first = manager.reserve(800)
+        admitted = []
+        thread = threading.Thread(target=lambda: admitted.append(manager.reserve(500)))
+        thread.start()
+        time.sleep(0.1)
+        first.release()
+        thread.join(5)
+        self.assertEqual(len(admitted), 1)
+
+    @override_settings(DOWNLOAD_QUEUE_MAX=0)
+    def test_full_queue_refuses_immediately(self):
+        manager = self._manager()
+        manager.reserve(800)
+        started = time.monotonic()
+        with self.assertRaises(InsufficientStorage):
+            manager.reserve(500)
+        self.assertLess(time.monotonic() - started, 0.2)
+
+    def test_job_larger_than_disk_is_refused_immediately(self):
+        with self.assertRaises(InsufficientStorage):
+            self._manager().reserve(2000)
+
+    def test_reservations_of_dead_workers_are_purged(self):
+        manager = self._manager()
+        manager.reserve(800)
+        with mock.patch.object(storage, "_pid_alive", return_value=False):
+            manager.reserve(800)
+
+    @override_settings(DOWNLOAD_DISK_BUDGET=1000)
+    def test_fixed_budget(self):
+        self.free = 10 ** 12
+        manager = self._manager()
+        manager.reserve(600)
+        with self.assertRaises(InsufficientStorage):
+            manager.reserve(600)
+
+
+@override_settings(DOWNLOAD_SIZE_MARGIN=1.0, DOWNLOAD_SIZE_FALLBACK=123)
+class EstimateOutputSizeTests(SimpleTestCase):
+    info = {
+        "duration": 100,
+        "formats": [
+            {"format_id": "140", "vcodec": "none", "acodec": "mp4a", "abr": 128, "filesize": 1_000},
+            {"format_id": "251", "vcodec": "none", "acodec": "opus", "abr": 160, "filesize_approx": 2_000},
+            {"format_id": "137", "vcodec": "avc1", "acodec": "none", "tbr": 80},
+            {"format_id": "18", "vcodec": "avc1", "acodec": "mp4a", "filesize": 5_000},
+        ],
+    }
+
+    def test_audio_uses_filesize(self):
+        self.assertEqual(estimate_output_size(self.info, "140", "audio"), 1_000)
+        self.assertEqual(estimate_output_size(self.info, "251", "audio"), 2_000)
+
+    def test_video_with_audio(self):
+        self.assertEqual(estimate_output_size(self.info, "18", "video"), 5_000)
+
+    def test_video_only_adds_best_audio_and_merge_copy(self):
+        # tbr 80 kbit/s * 100 s = 1 000 000 octets, + meilleur audio (251), x2 pour la fusion.
+        self.assertEqual(estimate_output_size(self.info, "137", "video"), (1_000_000 + 2_000) * 2)
+
+    def test_clip_is_prorated(self):
+        clip = ClipPlan(start=10, end=35, precise=False)
+        self.assertEqual(estimate_output_size(self.info, "18", "video", clip), 1_250)
+
+    def test_unknown_format_uses_fallback(self):
+        self.assertEqual(estimate_output_size(self.info, "999", "video"), 123)
+        self.assertEqual(estimate_output_size({"formats": [{"format_id": "1"}]}, "1", "audio"), 123)
+
+    @override_settings(DOWNLOAD_SIZE_MARGIN=1.5)
+    def test_margin(self):
+        self.assertEqual(estimate_output_size(self.info, "140", "audio"), 1_500)
+
+
+class _FakeYoutubeDL:
+    """Télécharge 300 octets dans le dossier du job (à la place de yt-dlp)."""
+
+    written = 0
+
+    def __init__(self, opts):
+        self.opts = opts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False):
+        path = os.path.join(os.path.dirname(self.opts["outtmpl"]), "Titre [aaaaaaaaaaa].m4a")
+        with open(path, "wb") as fh:
+            fh.write(b"x" * 300)
+        _FakeYoutubeDL.written += 300
+        return {}
+
+
+@override_settings(DOWNLOAD_DISK_BUDGET=0, DOWNLOAD_DISK_MARGIN=0, DOWNLOAD_SIZE_MARGIN=1.0)
+class DownloadReservationTests(TestCase):
+    info = {
+        "id": "aaaaaaaaaaa", "title": "Titre", "duration": 10,
+        "formats": [{"format_id": "140", "ext": "m4a", "vcodec": "none", "acodec": "mp4a", "filesize": 900}],
+    }
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.manager = StorageManager(db_path=os.path.join(tmp.name, "reservations.sqlite3"))
+        _FakeYoutubeDL.written = 0
+        for patcher in (
+            mock.patch("downloader.views.storage_manager", self.manager),
+            mock.patch("downloader.views.get_video_info", return_value=self.info),
+            mock.patch("yt_dlp.YoutubeDL", _FakeYoutubeDL),
+            # L'espace libre reflète ce que le job a écrit (même fichier supprimé mais ouvert).
+            mock.patch.object(storage.shutil, "disk_usage",
+                              side_effect=lambda _: DiskUsage(0, 0, 10_000 - _FakeYoutubeDL.written)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_reservation_during_streaming_and_after_close(self):
+        response = self.client.post(reverse("downloader:download"), {
+            "url": "https://www.youtube.com/watch?v=aaaaaaaaaaa", "mode": "audio", "format_id": "140",
+        })
+        self.assertEqual(response.status_code, 200)
+        (tmpdir,) = self.manager._conn().execute("SELECT path FROM reservation").fetchone()
+
+        # Envoi en cours : le fichier est encore dans le dossier du job et n'est compté
+        # qu'une fois (dans l'espace libre), pas une seconde fois comme « à écrire ».
+        self.assertTrue(os.path.isdir(tmpdir))
+        self.assertEqual(self.manager.budget(), 10_000 - 300)
+        self.assertEqual(b"".join(response.streaming_content), b"x" * 300)
+
+        response.close()
+        self.assertFalse(os.path.exists(tmpdir))
+        self.assertEqual(self.manager._conn().execute("SELECT COUNT(*) FROM reservation").fetchone()[0], 0)
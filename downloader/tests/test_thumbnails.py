@@ -0,0 +1,103 @@
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+
+from downloader.services import thumbnails
+
+
+def _fake_fetch(video_id):
+    """Miniature d'origine générée localement (pas d'accès au CDN)."""
+    path = thumbnails._cache_dir() / f"{video_id}.jpg"
+    if not path.exists():
+        Image = thumbnails._pil_image()
+        buf = io.BytesIO()
+        Image.effect_noise((320, 180), 64).convert("RGB").save(buf, "JPEG", quality=95)
+        path.write_bytes(buf.getvalue())
+    return path
+
+
+class ThumbnailCacheTests(SimpleTestCase):
+    def setUp(self):
+        if thumbnails._pil_image() is None:
+            self.skipTest("Pillow non installé")
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        for patcher in (
+            mock.patch.object(thumbnails, "_fetch_original", side_effect=_fake_fetch),
+            mock.patch.object(thumbnails, "_cache_size", thumbnails._CacheSize()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _age(self, *names, seconds=100):
+        past = time.time() - seconds
+        for name in names:
+            os.utime(self.root / name, (past, past))
+
+    def test_cache_is_capped_and_evicts_least_recently_used(self):
+        with override_settings(THUMBNAIL_CACHE_DIR=str(self.root), THUMBNAIL_CACHE_MAX_BYTES=10 ** 9):
+            thumbnails.get_thumbnail("aaaaaaaaaaa", 160)
+            thumbnails.get_thumbnail("bbbbbbbbbbb", 160)
+            self._age("aaaaaaaaaaa.jpg", "aaaaaaaaaaa_160.webp", seconds=200)
+            self._age("bbbbbbbbbbb.jpg", "bbbbbbbbbbb_160.webp", seconds=100)
+            # Accès récent : "a" redevient plus récent que "b".
+            thumbnails.get_thumbnail("aaaaaaaaaaa", 160)
+
+            used = sum(p.stat().st_size for p in self.root.iterdir())
+            with override_settings(THUMBNAIL_CACHE_MAX_BYTES=used):
+                thumbnails.get_thumbnail("ccccccccccc", 160)
+
+        names = {p.name for p in self.root.iterdir()}
+        self.assertIn("ccccccccccc_160.webp", names)
+        self.assertIn("aaaaaaaaaaa_160.webp", names)
+        self.assertNotIn("bbbbbbbbbbb_160.webp", names)
+        self.assertLessEqual(sum(p.stat().st_size for p in self.root.iterdir()), used)
+
+    def test_directory_is_scanned_only_when_the_estimate_exceeds_the_cap(self):
+        with override_settings(THUMBNAIL_CACHE_DIR=str(self.root), THUMBNAIL_CACHE_MAX_BYTES=10 ** 9), \
+                mock.patch.object(thumbnails, "_evict", wraps=thumbnails._evict) as evict:
+            for i in range(5):
+                thumbnails.get_thumbnail(f"{i}" * 11, 160)
+            self.assertEqual(evict.call_count, 1)  # premier passage : taille inconnue
+
+            with override_settings(THUMBNAIL_CACHE_MAX_BYTES=1):
+                thumbnails.get_thumbnail("zzzzzzzzzzz", 160)
+            self.assertEqual(evict.call_count, 2)
+
+    def test_etag_is_stable_across_accesses(self):
+        with override_settings(THUMBNAIL_CACHE_DIR=str(self.root)):
+            path, content_type = thumbnails.get_thumbnail("aaaaaaaaaaa", 320)
+            etag = thumbnails.etag_for(path)
+            self._age(path.name)
+            thumbnails.get_thumbnail("aaaaaaaaaaa", 320)
+        self.assertEqual(content_type, "image/webp")
+        self.assertEqual(thumbnails.etag_for(path), etag)
+
+    def test_invalid_parameters(self):
+        with self.assertRaises(ValueError):
+            thumbnails.get_thumbnail("short", 160)
+        with self.assertRaises(ValueError):
+            thumbnails.get_thumbnail("aaaaaaaaaaa", 999)
+
+
+class ThumbnailViewTests(SimpleTestCase):
+    def test_evicted_file_redirects_to_youtube(self):
+        missing = Path(tempfile.gettempdir()) / "evicted_thumbnail.webp"
+        with mock.patch.object(thumbnails, "get_thumbnail", return_value=(missing, "image/webp")):
+            response = self.client.get(reverse("downloader:thumbnail", args=["aaaaaaaaaaa", 320]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response["Location"], thumbnails.source_url("aaaaaaaaaaa"))
+
+    def test_file_evicted_before_open_redirects_to_youtube(self):
+        missing = Path(tempfile.gettempdir()) / "evicted_thumbnail.webp"
+        with mock.patch.object(thumbnails, "get_thumbnail", return_value=(missing, "image/webp")), \
+                mock.patch.object(thumbnails, "etag_for", return_value='"x"'):
+            response = self.client.get(reverse("downloader:thumbnail", args=["aaaaaaaaaaa", 320]))
+        self.assertEqual(response.status_code, 302)
@@ -7,8 +7,10 @@ urlpatterns = [
     path("", views.home, name="home"),
     path("search/", views.search, name="search"),
     path("select/<str:video_id>/", views.select_video, name="select_video"),
+    path("thumb/<str:video_id>/<int:width>/", views.thumbnail, name="thumbnail"),
     path("options/", views.options, name="options"),
     path("download/", views.download_media,name="download"),
     path("history/", views.history, name="history"),
     path("signup/", views.signup, name="signup"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
\ No newline at end of file
@@ -1,11 +1,21 @@
 import os
 import shutil
 import tempfile
+import time
 from urllib.parse import urlencode
-from user_agents import parse as parse_ua 
 
+from django.conf import settings
 from django.db.models import Q
-from django.http import FileResponse
+from django.contrib import admin
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    HttpResponseRedirect,
+)
+from django.utils.crypto import constant_time_compare
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
@@ -14,17 +24,32 @@ from django.urls import reverse
 
 from .models import DownloadEvent
 from .forms import HomeForm, SignupForm
+from .services import metrics, profiling, thumbnails
+from .services.clips import plan_clip, clip_ydl_options, clip_cache_key, get_cached_clip, store_clip
+from .services.storage import InsufficientStorage, ReleasingFile, estimate_output_size, storage_manager
+from .services.prefetch import prefetch_search_results, cancel_prefetch
 from .services.youtube import search_youtube_videos
 from .services.ytdlp_service import (
     is_allowed_youtube_url,
-    extract_video_info,
+    get_video_info,
     build_audio_choices,
     build_video_choices,
+    PostprocessorTimer,
 )
-from yt_dlp import YoutubeDL
+
+
+def _cancel_prefetch(request):
+    """
+    L'utilisateur quitte la page de résultats (accueil, nouvelle recherche, autre page de résultats) :
+    on abandonne le préchargement restant. L'id du lot est porté par les liens de
+    search.html (pas de session : aucune écriture ni cookie sur la recherche).
+    Sinon le lot expire seul après PREFETCH_BATCH_TTL.
+    """
+    cancel_prefetch(request.GET.get("batch"))
 
 
 def home(request):
+    _cancel_prefetch(request)
     form = HomeForm(request.POST or None)
 
     if request.method == "POST" and form.is_valid():
@@ -57,8 +82,14 @@ def search(request):
     except Exception as exc:
         error = str(exc)
 
+    # Précharge les métadonnées des premiers résultats : le clic suivant est presque
+    # toujours sur l'un d'eux, et `options` les trouvera alors en cache.
+    _cancel_prefetch(request)
+    batch = prefetch_search_results(payload["items"])
+
     context = {
         "q": q,
+        "prefetch_batch": batch,
         "items": payload["items"],
         "next_page_token": payload["next_page_token"],
         "prev_page_token": payload["prev_page_token"],
@@ -71,12 +102,37 @@ def select_video(request, video_id: str):
     """
     Quand l'utilisateur choisit une vidéo depuis la recherche,
     on construit son URL puis on redirige vers la page options (étape 3).
+    Le préchargement n'est pas annulé : la vidéo choisie est souvent encore en file.
     """
     url = f"https://www.youtube.com/watch?v={video_id}"
     qs = urlencode({"url": url})
     return redirect(f"{reverse('downloader:options')}?{qs}")
 
 
+def thumbnail(request, video_id: str, width: int):
+    """
+    Proxy des miniatures de recherche : récupérées une fois sur le CDN YouTube,
+    mises en cache disque, servies en WebP réduit avec un cache navigateur long.
+    """
+    try:
+        path, content_type = thumbnails.get_thumbnail(video_id, width)
+        etag = thumbnails.etag_for(path)
+        if etag in request.META.get("HTTP_IF_NONE_MATCH", ""):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, "rb"), content_type=content_type)
+    except ValueError:
+        raise Http404("Miniature invalide")
+    except Exception:
+        # CDN injoignable / Pillow en erreur / fichier évincé entre-temps :
+        # l'image reste affichable depuis YouTube.
+        return HttpResponseRedirect(thumbnails.source_url(video_id))
+
+    response["ETag"] = etag
+    response["Cache-Control"] = f"public, max-age={settings.THUMBNAIL_MAX_AGE}, immutable"
+    return response
+
+
 def options(request):
     """
     Étape 3:
@@ -97,7 +153,7 @@ def options(request):
     video_choices = []
 
     try:
-        info = extract_video_info(url)
+        info = get_video_info(url)
         audio_choices = build_audio_choices(info)
         video_choices = build_video_choices(info)
     except Exception as exc:
@@ -148,6 +204,11 @@ def download_media(request):
     if not is_allowed_youtube_url(url):
         return redirect(f"{reverse('downloader:options')}?{urlencode({'url': url})}")
 
+    # Imports à la demande : yt-dlp et user-agents pèsent ~0,35s au démarrage d'un worker
+    # (préchargés dans le master gunicorn, voir gunicorn.conf.py).
+    from user_agents import parse as parse_ua
+    from yt_dlp import YoutubeDL
+
     # Parse user agent (navigateur / OS / device)
     ua_str = request.META.get("HTTP_USER_AGENT", "")
     ua = parse_ua(ua_str)
@@ -156,8 +217,8 @@ def download_media(request):
     device = ua.device.family or ""
     ip = _get_client_ip(request)
 
-    # Re-extract info pour récupérer titre + label exact du format (fiable côté serveur)
-    info = extract_video_info(url)
+    # Infos (cache ou extraction) pour récupérer titre + label exact du format (fiable côté serveur)
+    info = get_video_info(url)
     title = info.get("title") or ""
     video_id = info.get("id") or ""
 
@@ -185,7 +246,67 @@ def download_media(request):
         # Cela nécessite FFmpeg.
         ytdlp_format = f"{format_id}+bestaudio/best"
 
+    # Extrait optionnel (début / fin) : seule la section demandée est téléchargée.
+    try:
+        clip = plan_clip(
+            info,
+            request.POST.get("start") or "",
+            request.POST.get("end") or "",
+            precise=request.POST.get("precise") == "1",
+        )
+    except ValueError as exc:
+        return render(request, "downloader/options.html", {
+            "url": url,
+            "error": str(exc),
+            "info": info,
+            "audio_choices": build_audio_choices(info),
+            "video_choices": build_video_choices(info),
+        })
+
+    clip_key = None
+    if clip:
+        quality_label = f"{quality_label} [{clip.label}]"
+        clip_key = clip_cache_key(str(video_id), ytdlp_format, clip)
+
+    event = {
+        "user": request.user if request.user.is_authenticated else None,
+        "video_url": url,
+        "video_id": str(video_id),
+        "title": title,
+        "mode": mode,
+        "format_id": format_id,
+        "ext": ext,
+        "quality_label": quality_label,
+        "ip_address": ip,
+        "user_agent": ua_str,
+        "browser": browser,
+        "os": os_name,
+        "device": device,
+    }
+
+    # Même vidéo, même format, même plage : le clip est déjà prêt.
+    cached = get_cached_clip(clip_key) if clip_key else None
+    if cached:
+        DownloadEvent.objects.create(**event)
+        return _serve_file(str(cached), mode)
+
+    # Réserve l'espace disque estimé avant de lancer le job (attente ou refus si saturé).
+    # Le dossier du job est suivi : ce qui y est déjà écrit n'est plus compté comme à venir.
     tmpdir = tempfile.mkdtemp(prefix="ytdlp_")
+    try:
+        reservation = storage_manager.reserve(estimate_output_size(info, format_id, mode, clip), path=tmpdir)
+    except InsufficientStorage as exc:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        return render(request, "downloader/options.html", {
+            "url": url,
+            "error": str(exc),
+            "info": info,
+            "audio_choices": build_audio_choices(info),
+            "video_choices": build_video_choices(info),
+        }, status=503)
+
+    pp_timer = PostprocessorTimer()
+    released_on_close = False
 
     try:
         # On force un nom stable pour retrouver le fichier facilement
@@ -197,14 +318,28 @@ def download_media(request):
             "format": ytdlp_format,
             "outtmpl": outtmpl,
             "merge_output_format": "mp4" if mode == "video" else None,
+            "postprocessor_hooks": [pp_timer.hook],
         }
 
         # Retire la clé si None (yt-dlp n’aime pas certaines valeurs)
         if ydl_opts["merge_output_format"] is None:
             ydl_opts.pop("merge_output_format")
 
-        with YoutubeDL(ydl_opts) as ydl:
-            ydl.extract_info(url, download=True)
+        if clip:
+            ydl_opts.update(clip_ydl_options(clip))
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with YoutubeDL(ydl_opts) as ydl:
+                ydl.extract_info(url, download=True)
+            outcome = "ok"
+        finally:
+            # La fusion FFmpeg est mesurée à part : on la retire du temps de téléchargement.
+            elapsed = time.perf_counter() - start
+            metrics.DOWNLOAD_SECONDS.labels(mode, outcome).observe(max(elapsed - pp_timer.total, 0.0))
+            if "Merger" in pp_timer.durations:
+                metrics.MERGE_SECONDS.observe(pp_timer.durations["Merger"])
 
         # On récupère le fichier final téléchargé (hors .part)
         files = []
@@ -224,35 +359,78 @@ def download_media(request):
 
         # Prend le fichier le plus gros (souvent le bon pour vidéo)
         filepath = max(files, key=lambda p: os.path.getsize(p))
-        filename = os.path.basename(filepath)
+
+        # Fichier final connu : la réservation passe de l'estimation à la taille réelle.
+        # Le fichier reste dans tmpdir jusqu'à la fin de l'envoi, donc il n'est plus compté
+        # comme « à écrire ». Un clip part dans le cache des clips (borné à part) : 0.
+        if clip_key:
+            filepath = str(store_clip(clip_key, filepath))
+            reservation.resize(0)
+        else:
+            reservation.resize(os.path.getsize(filepath))
 
         # Sauvegarder l'évènement
-        DownloadEvent.objects.create(
-            user=request.user if request.user.is_authenticated else None,
-            video_url=url,
-            video_id=str(video_id),
-            title=title,
-            mode=mode,
-            format_id=format_id,
-            ext=ext,
-            quality_label=quality_label,
-            ip_address=ip,
-            user_agent=ua_str,
-            browser=browser,
-            os=os_name,
-            device=device,
-        )
+        DownloadEvent.objects.create(**event)
+
+        def on_close():
+            # Fichier entièrement envoyé (et donc fermé) : on libère l'espace réservé
+            # puis on supprime le dossier temporaire.
+            reservation.release()
+            shutil.rmtree(tmpdir, ignore_errors=True)
 
-        return FileResponse(open(filepath, "rb"), as_attachment=True, filename=filename)
+        response = _serve_file(filepath, mode, on_close=on_close)
+        released_on_close = True
+        return response
 
     finally:
-        # Pour un portfolio c’est OK, mais en prod il faut un nettoyage asynchrone.
-        # Ici on supprime le dossier temporaire immédiatement.
-        # (Selon l’OS, le fichier peut être encore ouvert : si tu vois des erreurs, on ajustera.)
-        try:
+        # Erreur avant l'envoi : rien ne sera fermé par FileResponse, on nettoie ici.
+        if not released_on_close:
+            reservation.release()
             shutil.rmtree(tmpdir, ignore_errors=True)
-        except Exception:
-            pass
+
+
+def _serve_file(filepath: str, mode: str, on_close=None) -> FileResponse:
+    size = os.path.getsize(filepath)
+    metrics.FILE_SIZE_BYTES.labels(mode).observe(size)
+    metrics.BYTES_SERVED.labels(mode).inc(size)
+    fh = ReleasingFile(filepath, on_close) if on_close else open(filepath, "rb")
+    return FileResponse(fh, as_attachment=True, filename=os.path.basename(filepath))
+
+def metrics_view(request):
+    """
+    Expose les métriques au format texte Prometheus.
+    Si METRICS_TOKEN est défini, on exige `Authorization: Bearer <token>`.
+    Hors DEBUG, l'endpoint reste fermé tant qu'aucun jeton n'est configuré.
+    """
+    token = settings.METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponseForbidden("METRICS_TOKEN non configuré")
+    if token:
+        auth = request.META.get("HTTP_AUTHORIZATION", "")
+        if not constant_time_compare(auth, f"Bearer {token}"):
+            return HttpResponseForbidden("Forbidden")
+    return HttpResponse(metrics.render_latest(), content_type=metrics.CONTENT_TYPE)
+
+def profile_index(request):
+    """
+    Admin : liste des profils de requêtes capturés par ProfilingMiddleware.
+    (Enveloppée par admin.site.admin_view dans config/urls.py.)
+    """
+    context = {
+        **admin.site.each_context(request),
+        "title": "Profils de requêtes",
+        "profiles": profiling.list_profiles(),
+        "profiling_enabled": settings.PROFILING_ENABLED,
+        "profiling_header": settings.PROFILING_HEADER,
+    }
+    return render(request, "admin/downloader/profiles.html", context)
+
+
+def profile_download(request, filename: str):
+    path = profiling.get_profile_path(filename)
+    if path is None:
+        raise Http404("Profil introuvable")
+    return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
 
 @login_required
 def history(request):